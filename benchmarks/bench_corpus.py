@@ -0,0 +1,65 @@
+"""
+Generate a synthetic site with comments.pelican.util, and time site-wide work on it.
+
+Usage:
+    python benchmarks/bench_corpus.py [--slugs 200] [--top 50] [--seed 1] [--path DIR]
+
+Reports generation throughput and the peak memory of the worker processes,
+then times the integrity check (comments.pelican.check) and the feed merge
+(comments.pelican.feeds) over the whole corpus. Pass --path to keep the
+corpus around for other benchmarks.
+"""
+
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+from comments.pelican import util, check, data, feeds
+
+class Article:
+    def __init__(self, thread):
+        self.slug = thread.slug
+        self.title = thread.slug
+        self.url = f"{thread.slug}.html"
+        self.comments = thread
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slugs", type=int, default=200, help="number of threads")
+    parser.add_argument("--top", type=float, default=50, help="mean number of top-level comments per thread")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--jobs", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--path", help="comments directory to generate (kept afterwards)")
+    args = parser.parse_args(argv)
+    
+    path = args.path or tempfile.mkdtemp()
+    
+    try:
+        started = time.perf_counter()
+        total = sum(count for slug, count in util.generate_corpus(path, args.slugs, args.jobs, seed=args.seed, top=args.top))
+        elapsed = time.perf_counter() - started
+        
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+        print(f"generate: {total} comments in {args.slugs} threads, {elapsed:.2f}s ({total/elapsed:.0f} comments/s), worker peak RSS {peak:.0f}MB")
+        
+        started = time.perf_counter()
+        issues = sum(1 for x in check.check(path, jobs=args.jobs))
+        elapsed = time.perf_counter() - started
+        print(f"check:    {issues} issues, {elapsed:.2f}s ({total/elapsed:.0f} comments/s)")
+        
+        started = time.perf_counter()
+        streams = []
+        for slug in sorted(check.slugs(path)):
+            thread = data.Thread(slug, COMMENTS_PATH=path)
+            thread.load()
+            streams.append(feeds.newest(Article(thread), 20))
+        latest = feeds.latest(streams, 20)
+        elapsed = time.perf_counter() - started
+        print(f"feeds:    load threads + merge newest {len(latest)}, {elapsed:.2f}s")
+    finally:
+        if not args.path:
+            shutil.rmtree(path)
+
+if __name__ == "__main__":
+    main()
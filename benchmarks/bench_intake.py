@@ -0,0 +1,114 @@
+"""
+Load test for the comment intake server (comments.pelican.server).
+
+Usage:
+    python benchmarks/bench_intake.py [--url http://127.0.0.1:8000/] 
+                                      [--clients 50] [--requests 40] [--slugs 5]
+
+Without --url, starts a server on a temporary COMMENTS_PATH and stops it
+afterwards. Each client keeps a connection open and submits its comments one
+after the other, spread over the given number of slugs, then the number of
+submissions per second and latency percentiles are reported.
+"""
+
+import re
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from urllib.parse import urlsplit
+
+async def client(host, port, slugs, count, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    
+    try:
+        for index in range(count):
+            slug = slugs[index % len(slugs)]
+            payload = json.dumps({"author": "Load Test", "content": f"Comment number {index}\n\n* with\n* a list"}).encode("utf-8")
+            
+            started = time.perf_counter()
+            
+            writer.write(f"POST /{slug} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(payload)}\r\n\r\n".encode("latin-1") + payload)
+            await writer.drain()
+            
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line == b"\r\n":
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            
+            latencies.append(time.perf_counter() - started)
+            if status != 201:
+                errors.append(status)
+    finally:
+        writer.close()
+
+async def load(host, port, args):
+    slugs = [f"load-test-{x}" for x in range(args.slugs)]
+    latencies = []
+    errors = []
+    
+    started = time.perf_counter()
+    await asyncio.gather(*[client(host, port, slugs, args.requests, latencies, errors) for x in range(args.clients)])
+    elapsed = time.perf_counter() - started
+    
+    return latencies, errors, elapsed
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values)-1, int(len(values) * fraction))]
+
+def start_server(path, args):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "comments.pelican.server", path, "--port", "0", "--delay", str(args.delay)],
+        stdout=subprocess.PIPE, text=True)
+    
+    match = re.search(r"http://([^:]+):(\d+)/", process.stdout.readline())
+    if match is None:
+        process.terminate()
+        raise RuntimeError("Server didn't start")
+    
+    return process, match.group(1), int(match.group(2))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="server to test (default: start one)")
+    parser.add_argument("--clients", type=int, default=50, help="concurrent connections")
+    parser.add_argument("--requests", type=int, default=40, help="submissions per client")
+    parser.add_argument("--slugs", type=int, default=5, help="number of threads to spread submissions over")
+    parser.add_argument("--delay", type=float, default=0.01, help="batch delay of the started server")
+    args = parser.parse_args(argv)
+    
+    process = path = None
+    
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        path = tempfile.mkdtemp()
+        process, host, port = start_server(path, args)
+    
+    try:
+        latencies, errors, elapsed = asyncio.run(load(host, port, args))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if path is not None:
+            shutil.rmtree(path)
+    
+    print(f"submissions: {len(latencies)} ({len(errors)} errors) in {elapsed:.2f}s")
+    print(f"throughput:  {len(latencies)/elapsed:.1f} submissions/s")
+    print(f"latency:     p50 {percentile(latencies, 0.50)*1000:.1f}ms, p99 {percentile(latencies, 0.99)*1000:.1f}ms, max {max(latencies)*1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Memory benchmark: loading big comment files through a text file vs mmap.
+
+Usage:
+    python benchmarks/bench_mmap.py [--sizes 1 8 32]
+
+Writes one comment per size (in MB) to a temporary COMMENTS_PATH, then loads
+each one both ways and reports the peak memory allocated while loading
+(tracemalloc), next to the size of the resulting content.
+"""
+
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from comments.pelican import data
+
+LINE = "    at comments.pelican.data.Comment.load (data.py:123) -- pasted log line\n"
+
+def write_comment(thread, uid, megabytes):
+    comment = data.Comment(thread, uid=uid)
+    comment.metadata['author'] = "Benchmark"
+    comment.metadata['date'] = "2020-01-01T00:00:00+00:00"
+    
+    lines = (megabytes * 1024 * 1024) // len(LINE)
+    comment.save("Here's my log:\n\n" + LINE * lines)
+    
+def measure(thread, uid, threshold):
+    comment = data.Comment(thread, uid=uid)
+    comment.mmap_threshold = threshold
+    
+    tracemalloc.start()
+    started = time.perf_counter()
+    
+    comment.load()
+    
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return len(comment.content), peak, elapsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 8, 32], help="comment sizes, in MB")
+    args = parser.parse_args(argv)
+    
+    path = tempfile.mkdtemp()
+    
+    try:
+        thread = data.Thread("benchmark", COMMENTS_PATH=path)
+        
+        print(f"{'size':>6} {'method':>6} {'content MB':>11} {'peak MB':>8} {'peak/content':>13} {'seconds':>8}")
+        
+        for megabytes in args.sizes:
+            uid = f"big-{megabytes}"
+            write_comment(thread, uid, megabytes)
+            
+            for method, threshold in (("text", sys.maxsize), ("mmap", 1)):
+                length, peak, elapsed = measure(thread, uid, threshold)
+                print(f"{megabytes:>5}M {method:>6} {length/2**20:>11.2f} {peak/2**20:>8.2f} {peak/length:>13.2f} {elapsed:>8.3f}")
+    finally:
+        shutil.rmtree(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Throughput of each markdown renderer (see comments.pelican.render).
+
+Usage:
+    python benchmarks/bench_render.py [--repeat 200]
+
+Renders every sample comment from the test suite --repeat times with each
+renderer that is installed (bypassing the render cache).
+"""
+
+import os
+import glob
+import time
+import argparse
+from comments.pelican import render
+
+SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "comments", "pelican", "tests", "comments", "*", "*.md")
+
+def sources():
+    for path in sorted(glob.glob(SAMPLES)):
+        with open(path, encoding="utf-8") as fp:
+            yield fp.read().split("\n\n", 1)[1]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200, help="times to render each sample")
+    args = parser.parse_args(argv)
+    
+    samples = list(sources())
+    size = sum(len(x.encode("utf-8")) for x in samples) * args.repeat
+    count = len(samples) * args.repeat
+    
+    print(f"{'renderer':>12} {'comments/s':>11} {'MB/s':>7}")
+    
+    for name, renderer in render.renderers.items():
+        try:
+            instance = renderer()
+        except ImportError:
+            print(f"{name:>12} {'not installed':>19}")
+            continue
+        
+        started = time.perf_counter()
+        for repeat in range(args.repeat):
+            for source in samples:
+                instance.render(source)
+        elapsed = time.perf_counter() - started
+        
+        print(f"{name:>12} {count/elapsed:>11.0f} {size/elapsed/2**20:>7.2f}")
+
+if __name__ == "__main__":
+    main()
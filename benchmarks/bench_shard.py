@@ -0,0 +1,84 @@
+"""
+Flat vs sharded comment directories, for a slug with a lot of comments.
+
+Usage:
+    python benchmarks/bench_shard.py [--comments 100000] [--depths 0 1 2] [--lookups 2000]
+
+Writes --comments small comment files for one slug, then for each shard depth
+(moving the files with comments.pelican.reshard) times:
+    scan:   UIDMaker.load(), finding every uid
+    lookup: os.path.exists() on Comment.path for random uids
+    load:   Comment.load() for random uids
+    create: saving new comments
+"""
+
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from comments.pelican import data, reshard
+
+def populate(path, count):
+    thread = data.Thread("benchmark", COMMENTS_PATH=path)
+    os.makedirs(thread.comment_path)
+    
+    uids = [thread.uids.hashids.encode(x) for x in range(count)]
+    
+    for uid in uids:
+        with open(thread.uid_path(uid), "w") as fp:
+            fp.write(f"author: Benchmark\n\nComment {uid}\n")
+    
+    return uids
+
+def timed(function):
+    started = time.perf_counter()
+    function()
+    return time.perf_counter() - started
+
+def measure(path, depth, uids, lookups):
+    sample = random.sample(uids, min(lookups, len(uids)))
+    thread = data.Thread("benchmark", COMMENTS_PATH=path, COMMENTS_SHARD_DEPTH=depth)
+    
+    results = {}
+    results["scan"] = timed(lambda: data.UIDMaker("benchmark", **thread.config).load())
+    results["lookup"] = timed(lambda: [os.path.exists(data.Comment(thread, uid=x).path) for x in sample])
+    results["load"] = timed(lambda: [data.Comment(thread, uid=x).load() for x in sample])
+    
+    def create():
+        for index in range(lookups):
+            data.Comment(thread, uid=f"new-{depth}-{index}").save("New comment")
+    
+    results["create"] = timed(create)
+    
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=100000, help="comment files in the slug")
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1, 2], help="shard depths to compare")
+    parser.add_argument("--lookups", type=int, default=2000, help="comments to look up, load and create")
+    parser.add_argument("--path", help="directory to create the comments in (default: a temporary one)")
+    args = parser.parse_args(argv)
+    
+    random.seed(1)
+    path = tempfile.mkdtemp(dir=args.path)
+    
+    try:
+        uids = populate(path, args.comments)
+        
+        print(f"{args.comments} comments, {args.lookups} lookups/loads/creates")
+        print(f"{'depth':>5} {'scan s':>8} {'lookup s':>9} {'load s':>8} {'create s':>9}")
+        
+        for depth in args.depths:
+            for slug, moved, conflicts in reshard.reshard(path, depth):
+                pass
+            
+            results = measure(path, depth, uids, args.lookups)
+            print(f"{depth:>5} {results['scan']:>8.3f} {results['lookup']:>9.3f} {results['load']:>8.3f} {results['create']:>9.3f}")
+    finally:
+        shutil.rmtree(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Startup benchmark: import time of the plugin, and the cost of creating threads.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 20] [--threads 10000]
+
+Import time is measured in fresh interpreters (median of --runs), along with
+which of the heavy dependencies the import pulled in.
+"""
+
+import sys
+import timeit
+import argparse
+import statistics
+import subprocess
+import tempfile
+from comments.pelican import data
+
+HEAVY = ("markdown", "arrow", "hashids")
+
+IMPORT = f"""
+import sys, time
+started = time.perf_counter()
+import comments.pelican.data
+elapsed = time.perf_counter() - started
+print(elapsed, *[x for x in {HEAVY!r} if x in sys.modules])
+"""
+
+def import_time(runs):
+    times = []
+    
+    for run in range(runs):
+        output = subprocess.run([sys.executable, "-c", IMPORT], capture_output=True, text=True, check=True).stdout.split()
+        times.append(float(output[0]))
+        loaded = output[1:]
+        
+    return statistics.median(times), loaded
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20, help="fresh interpreters to time the import in")
+    parser.add_argument("--threads", type=int, default=10000, help="threads to create")
+    args = parser.parse_args(argv)
+    
+    elapsed, loaded = import_time(args.runs)
+    print(f"import comments.pelican.data: {elapsed*1000:.1f}ms (median of {args.runs}), loaded: {', '.join(loaded) or 'none'}")
+    
+    path = tempfile.gettempdir()
+    
+    elapsed = timeit.timeit(lambda: data.Thread("benchmark", COMMENTS_PATH=path), number=args.threads)
+    print(f"Thread():                     {elapsed/args.threads*1e6:.2f}us per thread")
+    
+    elapsed = timeit.timeit(lambda: data.Thread("benchmark", COMMENTS_PATH=path).uids(), number=args.threads)
+    print(f"Thread() + first uid:         {elapsed/args.threads*1e6:.2f}us per thread")
+
+if __name__ == "__main__":
+    main()
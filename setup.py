@@ -10,4 +10,9 @@ setup(
         "hashids",
         "arrow"
     ],
+    extras_require = {
+        "cmark": ["cmarkgfm"],
+        "markdown-it": ["markdown-it-py"],
+        "mistune": ["mistune"],
+    },
 )
\ No newline at end of file
@@ -14,14 +14,36 @@ TODO: put comment into into objects/dicts for easier use by jinja
 TODO: where to put comment metadata? (author, date/time)
 """
 
-from pelican import signals
-from comments.pelican import data
+from comments.pelican import config
+
+# pelican and the rest of the plugin are imported when the plugin is used,
+# not when the package is imported
 
 def inject_comments(article_generator):
+    from comments.pelican import data, cache, search
+    
+    cache.renders.resize(article_generator.settings.get('COMMENTS_RENDER_CACHE_SIZE', config.defaults['COMMENTS_RENDER_CACHE_SIZE']))
+    
+    index = search.open_index(article_generator.settings)
+    article_generator.comments_index = index
+    
     for article in article_generator.articles:
         thread = data.Thread(article.slug, **article.settings)
         article.comments = thread
         article.comments.load()
         
+        if index is not None:
+            for comment in thread:
+                index.update(comment)
+    
+    if index is not None:
+        index.prune()
+        index.save()
+        
 def register():
-    signals.article_generator_finalized.connect(inject_comments)
\ No newline at end of file
+    from pelican import signals
+    from comments.pelican import feeds, search
+    
+    signals.article_generator_finalized.connect(inject_comments)
+    signals.article_writer_finalized.connect(feeds.write_feeds)
+    signals.article_writer_finalized.connect(search.write_shards)
\ No newline at end of file
@@ -0,0 +1,112 @@
+"""
+Cache of rendered comments.
+
+Rendering markdown is the most expensive thing we do with a comment, and
+templates tend to ask for the same comment more than once (e.g. the article
+page and the feeds), so rendered output is memoized per comment, per format.
+
+One cache is shared by all threads (``renders``), bounded by the total length
+of the output it holds. The least recently used comments are dropped first.
+
+NOTE: this is not thread-safe, be careful using it in parallel operations.
+"""
+
+from collections import OrderedDict, namedtuple
+from . import config
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "evictions", "size", "maxsize"])
+
+class RenderCache:
+    """
+    LRU mapping of comment path -> {format: rendered output}.
+    
+    format can be any hashable key (Comment.parse() uses (renderer, format)).
+    
+    maxsize is the total length (in characters) of the output kept, across
+    all comments and formats. Output bigger than that is never cached.
+    """
+    def __init__(self, maxsize=config.defaults['COMMENTS_RENDER_CACHE_SIZE']):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.size = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+    def get(self, key, format, render):
+        """
+        Return the cached output for the given comment key and format, calling
+        render() to produce it if it isn't cached.
+        """
+        formats = self.entries.get(key)
+        
+        if formats is not None and format in formats:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return formats[format]
+        
+        self.misses += 1
+        output = render()
+        self.put(key, format, output)
+        
+        return output
+        
+    def put(self, key, format, output):
+        """
+        Store output for the given comment key and format, evicting the least 
+        recently used comments to stay under maxsize.
+        """
+        if len(output) > self.maxsize:
+            return
+        
+        formats = self.entries.setdefault(key, {})
+        self.size -= len(formats.get(format, ""))
+        
+        formats[format] = output
+        self.size += len(output)
+        self.entries.move_to_end(key)
+        self.trim()
+        
+    def trim(self):
+        """
+        Evict the least recently used comments until the cache fits maxsize.
+        """
+        while self.size > self.maxsize:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= sum(len(x) for x in evicted.values())
+            self.evictions += 1
+            
+    def resize(self, maxsize):
+        """
+        Change maxsize, evicting whatever no longer fits.
+        """
+        self.maxsize = maxsize
+        self.trim()
+        
+    def discard(self, key):
+        """
+        Drop every cached format of a comment (e.g. because its content changed).
+        """
+        formats = self.entries.pop(key, None)
+        
+        if formats is not None:
+            self.size -= sum(len(x) for x in formats.values())
+            
+    def clear(self):
+        """
+        Drop everything, and reset the counters.
+        """
+        self.entries.clear()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.evictions, self.size, self.maxsize)
+        
+    def __len__(self):
+        return len(self.entries)
+        
+renders = RenderCache()
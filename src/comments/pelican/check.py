@@ -0,0 +1,259 @@
+"""
+Integrity checks (and repairs) for every thread and comment in a COMMENTS_PATH.
+
+Usage:
+    python -m comments.pelican.check /blog/path/comments [--fix] [--jobs N] [--shard-depth N]
+
+Prints one JSON object per issue found, e.g.:
+    {"slug": "my-post", "uid": "xxxxxxx", "issue": "orphan", "detail": "...", "fixed": false}
+
+Issues:
+    malformed: a .thread line that can't be parsed (uid is the line number)
+    duplicate: a uid that appears more than once in a .thread
+    orphan:    a comment whose parent isn't in the thread (shows up under a
+               DummyComment)
+    cycle:     a comment whose parent is also one of its replies (uid is the
+               comment where the cycle closes)
+    level:     a level that doesn't match the parent's level + 1
+    missing:   a .thread entry without a comment file (shows up as [[deleted]])
+    stray:     a comment file that isn't in the .thread
+    misplaced: a comment file that isn't where COMMENTS_SHARD_DEPTH (given with
+               --shard-depth) puts it, so it shows up as [[deleted]] (run
+               reshard.py to move it)
+
+Each slug is checked on its own (in parallel), reading its .thread once and
+listing its comment directory (and any shard directories) once, in time
+linear in the size of the thread. Memory use is bounded by the largest
+thread, not the size of the site.
+
+With --fix, .thread files are rewritten: malformed lines and duplicates are
+dropped, orphans and the comments closing a cycle become top-level comments,
+levels are recalculated and stray comments are added as top-level comments.
+Missing comments are left alone, their replies still need them in place, and
+so are misplaced ones.
+
+Exits with status 1 if any issue is left unfixed.
+"""
+
+import os
+import sys
+import json
+import argparse
+from functools import partial
+from .data import SlugMixin, atomic_write, bounded_map
+
+class ThreadChecker(SlugMixin):
+    """
+    Checks (and optionally repairs) a single thread.
+    """
+    def __init__(self, slug, **config):
+        self.slug = slug
+        self.config = config
+        
+        # uid -> [level, order, parent], in file order
+        self.entries = {}
+        self.files = set()
+        # uid -> path, for files that aren't at uid_path(uid)
+        self.misplaced = {}
+        
+    def issue(self, uid, issue, detail, fixed=False):
+        return {"slug": self.slug, "uid": uid, "issue": issue, "detail": detail, "fixed": fixed}
+        
+    def read_thread(self, fix=False):
+        """
+        Parse the .thread file, yielding issues for lines that can't be used.
+        """
+        if not os.path.exists(self.thread_path):
+            return
+            
+        with open(self.thread_path, 'r', encoding="utf-8") as thread:
+            for lineno, line in enumerate(thread, 1):
+                if line.strip() == "":
+                    continue
+                    
+                parts = [x.strip() for x in line.split("\t")]
+                
+                try:
+                    level, order, uid = int(parts[0]), int(parts[1]), parts[2]
+                except (IndexError, ValueError):
+                    yield self.issue(str(lineno), "malformed", line.rstrip("\n"), fix)
+                    continue
+                    
+                parent = parts[3] if len(parts) > 3 else ""
+                
+                if uid in self.entries:
+                    yield self.issue(uid, "duplicate", f"line {lineno}", fix)
+                    continue
+                    
+                self.entries[uid] = [level, order, parent]
+                
+    def read_files(self):
+        """
+        Find the uids of all of the comment files for this slug, and the
+        ones that aren't where the shard depth puts them.
+        """
+        for uid, path in self.comment_files():
+            self.files.add(uid)
+            
+            if path != self.uid_path(uid):
+                self.misplaced[uid] = path
+                    
+    def levels(self):
+        """
+        Return the level each comment should be at, and the set of comments
+        that close a cycle of parents, in a single pass over the entries.
+        
+        Chains that end in a missing parent are counted from the first comment
+        that has no (usable) parent. In a cycle, the comment whose parent is 
+        already on the chain closes it, and is counted as a top-level comment.
+        """
+        levels = {}
+        cycles = set()
+        
+        for uid in self.entries:
+            # walk up until a known level, a top-level comment or a cycle
+            chain = []
+            on_chain = set()
+            base = -1
+            
+            while uid not in levels:
+                chain.append(uid)
+                on_chain.add(uid)
+                parent = self.entries[uid][2]
+                
+                if not parent or parent not in self.entries:
+                    break
+                if parent in on_chain:
+                    cycles.add(uid)
+                    break
+                
+                uid = parent
+            else:
+                base = levels[uid]
+                
+            for index, uid in enumerate(reversed(chain)):
+                levels[uid] = base + index + 1
+                
+        return levels, cycles
+        
+    def check(self, fix=False):
+        """
+        Yield every issue found with this thread, fixing the .thread file if
+        fix is True.
+        """
+        changed = False
+        
+        for issue in self.read_thread(fix):
+            changed = True
+            yield issue
+            
+        self.read_files()
+        
+        for uid, (level, order, parent) in self.entries.items():
+            if parent and parent not in self.entries:
+                yield self.issue(uid, "orphan", f"parent {parent} not found", fix)
+                if fix:
+                    self.entries[uid][2] = ""
+                changed = True
+                
+        levels, cycles = self.levels()
+        
+        for uid in cycles:
+            yield self.issue(uid, "cycle", f"parent {self.entries[uid][2]} is also a descendant", fix)
+            if fix:
+                self.entries[uid][2] = ""
+            changed = True
+            
+        for uid, (level, order, parent) in self.entries.items():
+            expected = levels[uid]
+            if level != expected:
+                yield self.issue(uid, "level", f"level {level}, should be {expected}", fix)
+                if fix:
+                    self.entries[uid][0] = expected
+                changed = True
+                
+            if uid not in self.files:
+                yield self.issue(uid, "missing", self.comment_path)
+                
+        for uid, path in sorted(self.misplaced.items()):
+            yield self.issue(uid, "misplaced", f"{path}, should be {self.uid_path(uid)}")
+            
+        order = max((x[1] for x in self.entries.values()), default=-1)
+        
+        for uid in sorted(self.files.difference(self.entries)):
+            yield self.issue(uid, "stray", self.thread_path, fix)
+            if fix:
+                order += 1
+                self.entries[uid] = [0, order, ""]
+            changed = True
+            
+        if fix and changed:
+            self.save()
+            
+    def save(self):
+        """
+        Write out the (fixed) entries as a new .thread file.
+        """
+        with atomic_write(self.thread_path) as fp:
+            for uid, (level, order, parent) in self.entries.items():
+                print(f"{level}\t{order}\t{uid}\t{parent}", file=fp)
+
+def check_thread(base_path, slug, fix=False, shard_depth=0):
+    """
+    Check a single slug, returns a list of issues.
+    """
+    checker = ThreadChecker(slug, COMMENTS_PATH=base_path, COMMENTS_SHARD_DEPTH=shard_depth)
+    
+    return list(checker.check(fix))
+
+def slugs(base_path):
+    """
+    Yield every slug in the comments directory, that has a thread, comments, or both.
+    """
+    seen = set()
+    
+    with os.scandir(base_path) as found:
+        for entry in found:
+            slug, ext = os.path.splitext(entry.name)
+            
+            if ext == ".thread" and entry.is_file():
+                pass
+            elif entry.is_dir() and not entry.name.startswith("."):
+                slug = entry.name
+            else:
+                continue
+                
+            if slug not in seen:
+                seen.add(slug)
+                yield slug
+
+def check(base_path, fix=False, jobs=None, shard_depth=0):
+    """
+    Check every slug in base_path, in parallel, yielding issues as they are found.
+    """
+    checker = partial(check_thread, base_path, fix=fix, shard_depth=shard_depth)
+    
+    for issues in bounded_map(checker, slugs(base_path), jobs):
+        yield from issues
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check threads and comments for consistency.")
+    parser.add_argument("path", help="comments directory (COMMENTS_PATH)")
+    parser.add_argument("--fix", action="store_true", help="rewrite .thread files to fix what can be fixed")
+    parser.add_argument("--jobs", type=int, default=None, help="number of worker processes (default: one per cpu)")
+    parser.add_argument("--shard-depth", type=int, default=0, help="COMMENTS_SHARD_DEPTH of the comments directory")
+    
+    args = parser.parse_args(argv)
+    
+    unfixed = 0
+    
+    for issue in check(os.path.abspath(args.path), args.fix, args.jobs, args.shard_depth):
+        print(json.dumps(issue))
+        
+        if not issue["fixed"]:
+            unfixed += 1
+            
+    return 1 if unfixed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
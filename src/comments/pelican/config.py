@@ -7,5 +7,15 @@ import os
 defaults = {
    'COMMENTS_SOURCE_DIR': "comments",
    'COMMENTS_EXTENSION': ".md",
-   'COMMENTS_OUTPUT_FORMAT': "html5"
+   'COMMENTS_OUTPUT_FORMAT': "html5",
+   'COMMENTS_RENDERER': "markdown",
+   'COMMENTS_SHARD_DEPTH': 0,
+   'COMMENTS_SEARCH_INDEX': None,
+   'COMMENTS_SEARCH_SHARDS': None,
+   'COMMENTS_RENDER_CACHE_SIZE': 32*1024*1024,
+   'COMMENTS_FEED_ATOM': "feeds/comments.atom.xml",
+   'COMMENTS_FEED_RSS': None,
+   'COMMENTS_ARTICLE_FEED_ATOM': "feeds/comments/{slug}.atom.xml",
+   'COMMENTS_ARTICLE_FEED_RSS': None,
+   'COMMENTS_FEED_MAX_ITEMS': 20
 }
\ No newline at end of file
@@ -22,21 +22,97 @@ Usage:
     [<Comment xxxxxxx>, <Comment yyyyyyyy>]
 """
 import os
-import markdown
-import arrow
 import textwrap
-from collections import defaultdict
-import glob
+from collections import defaultdict, deque
 import random
 import operator
-from . import errors
+import tempfile
+import mmap
+from contextlib import contextmanager
+from . import errors, cache, config, render
 
-from hashids import Hashids
+# markdown (see render.py), arrow and hashids are imported where they're used, so builds
+# that never render, parse dates or generate uids don't pay for them
+
+@contextmanager
+def atomic_write(path, encoding="utf-8", binary=False):
+    """
+    Open a temporary file next to path for writing, and move it over path once
+    it has been written completely, so readers never see a partial file.
+    
+    With binary=True the file is opened in binary mode (e.g. to wrap it in
+    gzip.open()), and encoding is ignored.
+    
+    Nothing is replaced if an exception is raised while writing.
+    """
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".", suffix=".tmp")
+    
+    try:
+        # mkstemp() files are private, keep the permissions of what we replace
+        try:
+            os.chmod(temp, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(temp, 0o644)
+        
+        if binary:
+            output = open(fd, "wb")
+        else:
+            output = open(fd, "w", encoding=encoding)
+            
+        with output:
+            yield output
+            
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.unlink(temp)
+        raise
+
+def bounded_map(fn, iterable, jobs=None):
+    """
+    Yield fn(x) for each x in iterable, in order, computed in parallel by jobs
+    worker processes (one per cpu by default).
+    
+    At most a few items per worker are queued at once, so this streams
+    through an iterable of any length.
+    """
+    # only the command line tools need worker processes, don't make builds pay for them
+    from concurrent.futures import ProcessPoolExecutor
+    
+    jobs = jobs or os.cpu_count() or 1
+    
+    with ProcessPoolExecutor(jobs) as executor:
+        window = jobs * 4
+        pending = deque()
+        
+        for item in iterable:
+            pending.append(executor.submit(fn, item))
+            
+            if len(pending) >= window:
+                yield pending.popleft().result()
+                
+        while pending:
+            yield pending.popleft().result()
+
+def shards(uid, depth):
+    """
+    Names of the nested shard directories a comment file goes in: one per
+    level of depth, each named by the next 2 characters of the uid (padded
+    with _ for short uids).
+    
+    >>> shards("jdycemcr", 2)
+    ['jd', 'yc']
+    """
+    return [uid[x*2:x*2+2].ljust(2, "_") for x in range(depth)]
 
 class SlugMixin:
     """
     Common code for classes that work with a slug-based directory.
     
+    Comment files are kept directly in the slug's directory, or when
+    COMMENTS_SHARD_DEPTH is set, in nested subdirectories named after uid
+    prefixes (see shards()), to keep directories small for huge threads.
+    
     API assumes your instances have the following variables:
     - config, dict (configuration settings)
     - slug, string (content slug)
@@ -68,6 +144,38 @@ class SlugMixin:
         path = os.path.join(self.base_path, f"{self.slug}.thread")
         
         return path
+        
+    @property
+    def shard_depth(self):
+        return int(self.config.get('COMMENTS_SHARD_DEPTH', config.defaults['COMMENTS_SHARD_DEPTH']))
+        
+    def uid_path(self, uid):
+        """
+        Return the path to the comment file for the given uid.
+        """
+        return os.path.join(self.comment_path, *shards(uid, self.shard_depth), f"{uid}.md")
+        
+    def comment_files(self):
+        """
+        Yield a (uid, path) tuple for every comment file for this slug.
+        
+        Walks the whole slug directory, so this finds comments in any layout,
+        sharded or not.
+        """
+        pending = [self.comment_path]
+        
+        while pending:
+            try:
+                found = os.scandir(pending.pop())
+            except FileNotFoundError:
+                continue
+                
+            with found:
+                for entry in found:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.name.endswith(".md"):
+                        yield entry.name[:-3], entry.path
     
     
 class UIDMaker(SlugMixin):
@@ -86,15 +194,25 @@ class UIDMaker(SlugMixin):
         self.slug = slug
         self.config = config
         self.uids = set()
-        self.hashids = Hashids(alphabet='abcdefghijklmnopqrstuvwxyz')
+        self._hashids = None
         self.max_retries = 10
         
+    @property
+    def hashids(self):
+        """
+        Hashids instance, created the first time a uid is generated.
+        """
+        if self._hashids is None:
+            from hashids import Hashids
+            self._hashids = Hashids(alphabet='abcdefghijklmnopqrstuvwxyz')
+            
+        return self._hashids
+        
     def load(self):
         """
         Scan a comment directory and load all of the existing uids.
         """
-        for path in glob.iglob(os.path.join(self.comment_path, "*.md")):
-            uid = os.path.splitext(os.path.basename(path))[0]
+        for uid, path in self.comment_files():
             self.uids.add(uid)
             
     def generate(self):
@@ -143,7 +261,7 @@ class Thread(SlugMixin):
         self.slug = slug
         self.config = config
         self.comments = []
-        self.uids = UIDMaker(slug)
+        self._uids = None
         
         # store the comment with the highest order for each level
         self.levels = {}
@@ -151,6 +269,21 @@ class Thread(SlugMixin):
         
         self.next = 0
         
+        # subtree metadata (Comment.position, .descendants, .span) is current
+        self._indexed = True
+        # Comment.last_activity is current
+        self._activity = False
+        
+    @property
+    def uids(self):
+        """
+        UIDMaker for this thread, created the first time it's needed.
+        """
+        if self._uids is None:
+            self._uids = UIDMaker(self.slug, **self.config)
+            
+        return self._uids
+        
     def __bool__(self):
         """
         True/False - False if no comments, True otherwise.
@@ -161,9 +294,136 @@ class Thread(SlugMixin):
         self.comments = []
         
         with open(self.thread_path, 'r', encoding=self.encoding) as thread:
+            # index once when everything is in place, not on every add()
+            self._indexed = False
+            
             for line in thread:
                 parsed = self._entry(line)
                 comment = self.add(parsed['level'], parsed['order'], parsed['uid'], parsed['parent'])
+        
+        self.reindex()
+    
+    def reindex(self):
+        """
+        Compute the position, number of descendants (and so the span of the
+        subtree) of every comment, in a single pass over the thread.
+        
+        A comment's subtree is itself plus every following comment with a 
+        greater level.
+        """
+        count = len(self.comments)
+        stack = []
+        
+        for index, comment in enumerate(self.comments):
+            while stack and stack[-1].level >= comment.level:
+                ancestor = stack.pop()
+                ancestor.descendants = index - ancestor.position - 1
+            
+            comment.position = index
+            stack.append(comment)
+        
+        for ancestor in stack:
+            ancestor.descendants = count - ancestor.position - 1
+        
+        self._indexed = True
+        self._activity = False
+        
+    def _index_added(self, subject):
+        """
+        Update the subtree metadata after subject was inserted into the thread,
+        without re-scanning the whole thread.
+        
+        Falls back to reindex() if subject landed in front of comments 
+        that now look like its own children.
+        """
+        position = self.comments.index(subject)
+        
+        following = position + 1
+        if following < len(self.comments) and self.comments[following].level > subject.level:
+            self.reindex()
+            return
+        
+        subject.position = position
+        subject.descendants = 0
+        
+        for index in range(following, len(self.comments)):
+            self.comments[index].position += 1
+            
+        for ancestor in self._ancestors(subject):
+            ancestor.descendants += 1
+            
+        self._push_activity(subject)
+        
+    def _ancestors(self, subject):
+        """
+        Yield the ancestors of an indexed comment, nearest first.
+        """
+        level = subject.level
+        for index in range(subject.position-1, -1, -1):
+            if level == 0:
+                break
+            
+            ancestor = self.comments[index]
+            if ancestor.level < level:
+                yield ancestor
+                level = ancestor.level
+                
+    def _push_activity(self, subject):
+        """
+        Fold the date of subject into the last activity of it and its
+        ancestors, rather than invalidating update_activity()'s results.
+        
+        Dates only move forward this way, which is what adding a comment (or
+        saving a new one) does.
+        """
+        if not self._activity:
+            return
+            
+        if not self._indexed or subject.position is None:
+            self._activity = False
+            return
+            
+        if not subject._loaded and os.path.exists(subject.path):
+            subject.load_metadata()
+            
+        date = subject.metadata.get("date")
+        if date is None:
+            return
+            
+        for comment in [subject, *self._ancestors(subject)]:
+            if comment._last_activity is not None and comment._last_activity >= date:
+                break
+            comment._last_activity = date
+    
+    def update_activity(self):
+        """
+        Compute the latest date in the subtree of every comment, in a single
+        (reverse) pass over the thread.
+        
+        Comment metadata is loaded as needed, to get the dates.
+        Results are kept until the thread changes.
+        """
+        if self._activity:
+            return
+        
+        # (level, latest date) of subtrees that haven't met their parent yet
+        stack = []
+        
+        for comment in reversed(self.comments):
+            if not comment._loaded and os.path.exists(comment.path):
+                comment.load_metadata()
+                
+            latest = comment.metadata.get("date")
+            
+            while stack and stack[-1][0] > comment.level:
+                level, date = stack.pop()
+                if latest is None or (date is not None and date > latest):
+                    latest = date
+            
+            comment._last_activity = latest
+            stack.append((comment.level, latest))
+            
+        self._activity = True
     
     def find(self, uid, level):
         """
@@ -285,7 +545,18 @@ class Thread(SlugMixin):
         
         comment = Comment(self, level=level, order=order, uid=uid, parent=parent)
         
+        replacing = comment.uid in self.dummies
+        dummies = len(self.dummies)
+        
         self.insert(comment)
+        
+        if self._indexed:
+            if replacing or len(self.dummies) != dummies:
+                # dummies shuffle whole subtrees around
+                self.reindex()
+            else:
+                self._index_added(comment)
+        
         return comment
         
     def save(self):
@@ -294,7 +565,7 @@ class Thread(SlugMixin):
         """
         os.makedirs(self.comment_path, exist_ok=True)
         
-        with open(self.thread_path, "w") as fp:
+        with atomic_write(self.thread_path, self.encoding) as fp:
             for index, comment in enumerate(self):
                 print(f"{comment.level}\t{comment.order}\t{comment.uid}\t{comment.parent}", file=fp)
                 
@@ -358,6 +629,9 @@ class Comment:
     """
     encoding = "utf-8"
     
+    # comment files at least this big are read through mmap (see _load_mapped())
+    mmap_threshold = 256 * 1024
+    
     def __init__(self, thread, level=0, order=0, uid=None, parent=None):
         """
         Constructor - read only
@@ -385,6 +659,28 @@ class Comment:
         if parent is None:
             parent = ""
         self.parent = parent
+        
+        # subtree metadata, maintained by the thread
+        self.position = None
+        self.descendants = 0
+        self._last_activity = None
+    
+    @property
+    def span(self):
+        """
+        range() of the positions of this comment and all of its descendants 
+        in the thread.
+        """
+        return range(self.position, self.position + self.descendants + 1)
+    
+    @property
+    def last_activity(self):
+        """
+        Latest date of this comment or any of its descendants (None if
+        none of them have a date).
+        """
+        self.thread.update_activity()
+        return self._last_activity
     
     @property
     def metadata(self):
@@ -408,18 +704,35 @@ class Comment:
         """
         Convert the raw markdown source to HTML for display.
         
-        Format can be any valid value you can pass to markdown.markdown
-        (currently 'xhtml', 'html5').
+        Rendering is done by the COMMENTS_RENDERER (see render.py). Format
+        can be any output format Python-Markdown supports (currently 'xhtml',
+        'html5'), other renderers ignore it.
         
         Alternatively, you can pass "markdown" to pass through the content 
         verbatim.
         
+        Rendered output is cached per format, see cache.renders.
+        
         TODO: format for the console, strip out tags.
         """
         if format == "markdown":
             return self._content
         else:
-            return markdown.markdown(self._content, output_format=format)
+            renderer = render.get(self.thread.config.get('COMMENTS_RENDERER', config.defaults['COMMENTS_RENDERER']))
+            
+            return cache.renders.get(self.path, (renderer.name, format), lambda: renderer.render(self._content, format))
+    
+    @property
+    def html(self):
+        """
+        Rendered content, in the configured COMMENTS_OUTPUT_FORMAT.
+        
+        Loads the comment if needed. Rendering happens on first access, and 
+        is cached (see cache.renders).
+        """
+        self.load(ignore_errors=True)
+        
+        return self.parse(self.thread.config.get('COMMENTS_OUTPUT_FORMAT', config.defaults['COMMENTS_OUTPUT_FORMAT']))
     
     @property
     def exists(self):
@@ -427,7 +740,7 @@ class Comment:
     
     @property
     def path(self):
-        path = os.path.join(self.thread.comment_path, "%s.md" % (self.uid,))
+        path = self.thread.uid_path(self.uid)
         
         return path
     
@@ -442,25 +755,85 @@ class Comment:
         key, val = [x.strip() for x in line.split(":", 1)]
         
         if key == "date":
+            import arrow
             val = arrow.get(val).datetime
         
         return (key, val)
     
+    def _read_metadata(self, source):
+        """
+        Read metadata lines from an open comment file, up to the first blank line.
+        """
+        for line in source:
+            if line.strip() == "":
+                break
+            else:
+                mkey, mval = self._parse_metadata(line)
+                self.metadata[mkey] = mval
+    
+    def load_metadata(self):
+        """
+        Load just the metadata, reading only the top of the comment file.
+        
+        Does nothing if the comment has been loaded already, or has metadata set.
+        """
+        if not self._loaded and not self._metadata:
+            with open(self.path, 'r') as source:
+                self._read_metadata(source)
+    
+    def _load_mapped(self):
+        """
+        Load a (big) comment file through mmap.
+        
+        The metadata is parsed out of the mapped file, and the content is 
+        decoded straight from it, so the str we keep is the only copy of 
+        the content in memory (reading through a text file buffers and copies
+        it a couple of times on the way).
+        """
+        with open(self.path, 'rb') as source:
+            with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                start = 0
+                size = len(mapped)
+                
+                while start < size:
+                    end = mapped.find(b"\n", start)
+                    if end == -1:
+                        end = size
+                        
+                    line = mapped[start:end].decode(self.encoding)
+                    start = end + 1
+                    
+                    if line.strip() == "":
+                        break
+                    else:
+                        mkey, mval = self._parse_metadata(line)
+                        self.metadata[mkey] = mval
+                
+                with memoryview(mapped) as view:
+                    with view[start:] as body:
+                        content = str(body, self.encoding)
+                
+        # match the newline translation of text mode
+        if "\r" in content:
+            content = content.replace("\r\n", "\n").replace("\r", "\n")
+            
+        self._content = content
+    
     def load(self, format='html5', ignore_errors=False):
         """
         Load the comment content
         """
         if not self._loaded:
             try:
-                with open(self.path, 'r') as source:
-                    for line in source:
-                        if line.strip() == "":
-                            break
-                        else:
-                            mkey, mval = self._parse_metadata(line)
-                            self.metadata[mkey] = mval
-                    
-                    self._content = source.read()
+                size = os.stat(self.path).st_size
+                
+                if size and size >= self.mmap_threshold:
+                    self._load_mapped()
+                else:
+                    with open(self.path, 'r', encoding=self.encoding) as source:
+                        self._read_metadata(source)
+                        
+                        self._content = source.read()
             except IOError:
                 if ignore_errors:
                     self._content = "[[deleted]]"
@@ -468,6 +841,7 @@ class Comment:
                     raise
                 
             self._loaded = True
+            cache.renders.discard(self.path)
             
     def save(self, content=None):
         """
@@ -477,13 +851,14 @@ class Comment:
         TODO: optionally update/set the date
         TODO: check if content or metadata has changed, don't bother if not.
         """
-        os.makedirs(self.thread.comment_path, exist_ok=True)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
         
         if content is not None:
             self._loaded = True
             self._content = content
+            cache.renders.discard(self.path)
         
-        with open(self.path, 'w', encoding=self.encoding) as output:
+        with atomic_write(self.path, self.encoding) as output:
             for key, val in self.metadata.items():
                 output.write("%s: %s\n" % (key, val))
                 
@@ -494,6 +869,8 @@ class Comment:
             else:
                 output.write(self.content)
                 
+        self.thread._push_activity(self)
+                
     def __repr__(self):
         return f'<{self.__class__.__name__} uid="{self.uid}" level="{self.level}" order="{self.order}" parent="{self.parent}">'
         
@@ -0,0 +1,119 @@
+"""
+Feeds of the latest comments, per article and site-wide.
+
+Each thread is reduced to its newest comments (reading only the metadata at
+the top of each comment file), and the site-wide feed is a k-way merge of
+those per-article lists. Only the comments that make it into a feed have
+their content loaded and rendered.
+
+Configuration (paths are relative to OUTPUT_PATH, None disables the feed):
+    COMMENTS_FEED_ATOM, COMMENTS_FEED_RSS: site-wide feeds
+    COMMENTS_ARTICLE_FEED_ATOM, COMMENTS_ARTICLE_FEED_RSS: per-article feeds,
+        {slug} is replaced with the article slug
+    COMMENTS_FEED_MAX_ITEMS: number of comments in each feed
+"""
+
+import heapq
+import itertools
+import operator
+from . import config
+
+date = operator.attrgetter("date")
+
+class FeedEntry:
+    """
+    Adapts a comment to what pelican's Writer.write_feed() expects of an article.
+    """
+    summary = None
+    
+    def __init__(self, comment, article):
+        self.comment = comment
+        self.article = article
+    
+    @property
+    def date(self):
+        return self.comment.metadata["date"]
+    
+    @property
+    def author(self):
+        return self.comment.metadata.get("author", "Unknown")
+    
+    @property
+    def title(self):
+        return f"{self.author} on {self.article.title}"
+    
+    @property
+    def url(self):
+        return f"{self.article.url}#comment-{self.comment.uid}"
+    
+    def get_content(self, site_url):
+        self.comment.load(ignore_errors=True)
+        
+        return self.comment.parse(self.comment.thread.config.get('COMMENTS_OUTPUT_FORMAT', config.defaults['COMMENTS_OUTPUT_FORMAT']))
+
+def newest(article, count):
+    """
+    The count most recent comments on an article, newest first, as FeedEntry
+    objects.
+    
+    Comments without a date (or without a file) are left out. Only count
+    entries are kept at a time, however big the thread.
+    """
+    def entries():
+        for comment in article.comments:
+            try:
+                comment.load_metadata()
+            except IOError:
+                continue
+            
+            if "date" in comment.metadata:
+                yield FeedEntry(comment, article)
+    
+    return heapq.nlargest(count, entries(), key=date)
+
+def latest(streams, count):
+    """
+    Merge lists of entries (each sorted newest first), returning the count
+    most recent overall.
+    """
+    merged = heapq.merge(*streams, key=date, reverse=True)
+    
+    return list(itertools.islice(merged, count))
+
+def write_feeds(article_generator, writer):
+    """
+    Write the per-article and site-wide comment feeds.
+    """
+    settings = article_generator.settings
+    context = article_generator.context
+    
+    def setting(key):
+        return settings.get(key, config.defaults[key])
+    
+    count = setting('COMMENTS_FEED_MAX_ITEMS')
+    
+    streams = []
+    
+    for article in article_generator.articles:
+        if not getattr(article, "comments", None):
+            continue
+        
+        entries = newest(article, count)
+        
+        if not entries:
+            continue
+        
+        streams.append(entries)
+        
+        for key, feed_type in (('COMMENTS_ARTICLE_FEED_ATOM', "atom"), ('COMMENTS_ARTICLE_FEED_RSS', "rss")):
+            path = setting(key)
+            if path:
+                writer.write_feed(entries, context, path.format(slug=article.slug),
+                                  feed_type=feed_type, feed_title=f"Comments on {article.title}")
+    
+    entries = latest(streams, count)
+    
+    for key, feed_type in (('COMMENTS_FEED_ATOM', "atom"), ('COMMENTS_FEED_RSS', "rss")):
+        path = setting(key)
+        if path:
+            writer.write_feed(entries, context, path, feed_type=feed_type, feed_title="Comments")
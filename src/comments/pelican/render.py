@@ -0,0 +1,117 @@
+"""
+Markdown renderers for comment content.
+
+Comment.parse() uses the renderer named by the COMMENTS_RENDERER setting:
+    markdown:    Python-Markdown (default)
+    cmark:       cmarkgfm, CommonMark through the (compiled) reference C
+                 implementation, by far the fastest
+    markdown-it: markdown-it-py, CommonMark in pure python
+    mistune:     mistune
+
+If the configured renderer is unknown, or its package isn't installed,
+Python-Markdown is used instead and a warning is logged.
+
+The CommonMark renderers differ from Python-Markdown in a few corner cases
+(e.g. "#Heading" without a space isn't a heading), and always produce the
+same HTML regardless of the output format. All of them pass raw HTML
+through, like Python-Markdown does.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Renderer:
+    """
+    Base for renderers, which turn markdown source into HTML.
+    
+    Subclasses set name (the COMMENTS_RENDERER value that selects them) and
+    implement render(source, format="html5"), returning the HTML as a str.
+    
+    They import what they need in __init__, so an ImportError is raised
+    when a renderer is created if it isn't available.
+    """
+    name = None
+
+class MarkdownRenderer(Renderer):
+    """
+    Python-Markdown. Keeps a Markdown instance per output format, which is
+    quite a bit faster than markdown.markdown() setting one up every time.
+    """
+    name = "markdown"
+    
+    def __init__(self):
+        import markdown
+        
+        self.markdown = markdown
+        self.instances = {}
+        
+    def render(self, source, format="html5"):
+        try:
+            instance = self.instances[format]
+        except KeyError:
+            instance = self.instances[format] = self.markdown.Markdown(output_format=format)
+            
+        return instance.reset().convert(source)
+
+class CMarkRenderer(Renderer):
+    name = "cmark"
+    
+    def __init__(self):
+        import cmarkgfm
+        from cmarkgfm.cmark import Options
+        
+        self.cmarkgfm = cmarkgfm
+        self.options = Options.CMARK_OPT_UNSAFE
+        
+    def render(self, source, format="html5"):
+        return self.cmarkgfm.markdown_to_html(source, options=self.options).rstrip("\n")
+
+class MarkdownItRenderer(Renderer):
+    name = "markdown-it"
+    
+    def __init__(self):
+        from markdown_it import MarkdownIt
+        
+        self.parser = MarkdownIt("commonmark")
+        
+    def render(self, source, format="html5"):
+        return self.parser.render(source).rstrip("\n")
+
+class MistuneRenderer(Renderer):
+    name = "mistune"
+    
+    def __init__(self):
+        import mistune
+        
+        self.parser = mistune.create_markdown(escape=False)
+        
+    def render(self, source, format="html5"):
+        return self.parser(source).rstrip("\n")
+
+renderers = {x.name: x for x in (MarkdownRenderer, CMarkRenderer, MarkdownItRenderer, MistuneRenderer)}
+
+# name -> Renderer instance (or the fallback, for ones that aren't available)
+_instances = {}
+
+def get(name="markdown"):
+    """
+    Return the renderer with the given name, falling back to Python-Markdown.
+    """
+    try:
+        return _instances[name]
+    except KeyError:
+        pass
+        
+    try:
+        renderer = renderers[name]()
+    except KeyError:
+        logger.warning("Unknown comment renderer '%s', using Python-Markdown", name)
+        renderer = get("markdown")
+    except ImportError as exc:
+        logger.warning("Comment renderer '%s' isn't available (%s), using Python-Markdown", name, exc)
+        renderer = get("markdown")
+        
+    _instances[name] = renderer
+    
+    return renderer
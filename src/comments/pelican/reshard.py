@@ -0,0 +1,128 @@
+"""
+Move comment files into the layout for a given COMMENTS_SHARD_DEPTH, in place.
+
+Usage:
+    python -m comments.pelican.reshard /blog/path/comments --depth 1 [--jobs N]
+
+Works from any layout (flat, or sharded at another depth), moving each file
+with a (hard) link and unlink, and removing shard directories left empty.
+It is safe to run again if interrupted. Don't build the site or accept
+comments while it runs.
+
+A comment file whose target already exists (e.g. the same uid under two shard
+directories, after restoring a backup) is never overwritten: it is left where
+it is and reported, to be sorted out by hand.
+
+Set COMMENTS_SHARD_DEPTH to the same depth afterwards.
+"""
+
+import os
+import sys
+import argparse
+from functools import partial
+from .data import SlugMixin, bounded_map
+from .check import slugs
+
+class Resharder(SlugMixin):
+    """
+    Moves the comment files of a single slug.
+    """
+    def __init__(self, slug, **config):
+        self.slug = slug
+        self.config = config
+        
+        # paths of files that weren't moved because their target exists
+        self.conflicts = []
+        
+    def reshard(self):
+        """
+        Move every comment file where it belongs, returns how many were moved.
+        """
+        moved = 0
+        created = set()
+        
+        for uid, path in list(self.comment_files()):
+            target = self.uid_path(uid)
+            
+            if path == target:
+                continue
+                
+            directory = os.path.dirname(target)
+            if directory not in created:
+                os.makedirs(directory, exist_ok=True)
+                created.add(directory)
+                
+            try:
+                os.link(path, target)
+            except FileExistsError:
+                # left behind by an interrupted run, or a different comment
+                if not os.path.samefile(path, target):
+                    self.conflicts.append(path)
+                    continue
+                    
+            os.unlink(path)
+            moved += 1
+            
+        self.prune(self.comment_path)
+        
+        return moved
+        
+    def prune(self, path):
+        """
+        Remove empty shard directories under path (but not path itself).
+        """
+        with os.scandir(path) as found:
+            directories = [x.path for x in found if x.is_dir(follow_symlinks=False)]
+            
+        for directory in directories:
+            self.prune(directory)
+            
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+
+def reshard_slug(base_path, slug, depth):
+    resharder = Resharder(slug, COMMENTS_PATH=base_path, COMMENTS_SHARD_DEPTH=depth)
+    
+    if not os.path.isdir(resharder.comment_path):
+        return slug, 0, []
+        
+    moved = resharder.reshard()
+    
+    return slug, moved, resharder.conflicts
+
+def reshard(base_path, depth, jobs=None):
+    """
+    Reshard every slug in base_path, in parallel, yielding (slug, files moved,
+    paths of files that couldn't be moved).
+    """
+    yield from bounded_map(partial(reshard_slug, base_path, depth=depth), slugs(base_path), jobs)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move comment files into a sharded (or flat) layout.")
+    parser.add_argument("path", help="comments directory (COMMENTS_PATH)")
+    parser.add_argument("--depth", type=int, required=True, help="new COMMENTS_SHARD_DEPTH (0 for flat)")
+    parser.add_argument("--jobs", type=int, default=None, help="number of worker processes (default: one per cpu)")
+    
+    args = parser.parse_args(argv)
+    
+    total = 0
+    unmoved = 0
+    
+    for slug, moved, conflicts in reshard(os.path.abspath(args.path), args.depth, args.jobs):
+        if moved:
+            print(f"{slug}: moved {moved} comments")
+        for path in conflicts:
+            print(f"{slug}: not moving {path}, another file with its uid is in the way", file=sys.stderr)
+        total += moved
+        unmoved += len(conflicts)
+        
+    print(f"Moved {total} comments, set COMMENTS_SHARD_DEPTH = {args.depth}")
+    
+    if unmoved:
+        print(f"{unmoved} comments couldn't be moved", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
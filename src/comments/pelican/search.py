@@ -0,0 +1,285 @@
+"""
+Search index of comments, kept up to date while the site is built.
+
+Settings:
+    COMMENTS_SEARCH_INDEX: path of the (gzipped JSON) index file, None
+        disables the index
+    COMMENTS_SEARCH_SHARDS: directory (relative to OUTPUT_PATH) to write the
+        index to as small JSON files for client-side search, None to skip
+
+Only comments whose file changed (size or modification time) since the last
+build are read again, the rest just cost a stat().
+
+Usage:
+    python -m comments.pelican.search /path/to/index.json.gz some words [--author NAME]
+        [--since 2020-01-01] [--until 2020-12-31] [--json]
+
+The persisted index just holds, for each comment, its file signature, author,
+date and the set of words it contains. The inverted index (word -> comments)
+and the author facet are rebuilt from that when the index is loaded.
+
+Client-side shards:
+    docs.json: list of [slug, uid, author, date, url], indexed by document number
+    words/<prefix>.json: {word: [document numbers]}, for words starting with the
+        (2 character) prefix
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import shutil
+import argparse
+from collections import defaultdict, Counter
+from . import config
+from .data import atomic_write
+
+WORD = re.compile(r"\w+")
+
+def tokenize(text):
+    """
+    Return the set of (lowercased) words in text, ignoring 1-letter words.
+    """
+    return {x for x in WORD.findall(text.lower()) if len(x) > 1}
+
+class Index:
+    """
+    Inverted index of comments.
+    
+    Documents are keyed by "slug/uid".
+    """
+    def __init__(self, path=None):
+        self.path = path
+        
+        # key -> {"signature": [mtime_ns, size], "author": ..., "date": ..., "words": [...]}
+        self.docs = {}
+        
+        self.postings = defaultdict(set)
+        self.authors = defaultdict(set)
+        
+        # keys seen by update() since the index was loaded
+        self.seen = set()
+        self.changed = False
+        
+    def load(self):
+        """
+        Read the index from self.path, if it exists.
+        """
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as fp:
+                docs = json.load(fp)
+        except FileNotFoundError:
+            return
+            
+        for key, doc in docs.items():
+            self._add(key, doc)
+            
+    def save(self):
+        """
+        Write the index to self.path (if anything changed).
+        """
+        if not self.changed:
+            return
+            
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        
+        with atomic_write(self.path, binary=True) as raw:
+            with gzip.open(raw, "wt", encoding="utf-8") as fp:
+                json.dump(self.docs, fp, separators=(",", ":"))
+        
+        self.changed = False
+        
+    def _add(self, key, doc):
+        self.docs[key] = doc
+        
+        for word in doc["words"]:
+            self.postings[word].add(key)
+            
+        if doc["author"]:
+            self.authors[doc["author"].lower()].add(key)
+            
+    def remove(self, key):
+        doc = self.docs.pop(key, None)
+        
+        if doc is None:
+            return
+            
+        for word in doc["words"]:
+            self.postings[word].discard(key)
+            if not self.postings[word]:
+                del self.postings[word]
+                
+        if doc["author"]:
+            author = doc["author"].lower()
+            self.authors[author].discard(key)
+            if not self.authors[author]:
+                del self.authors[author]
+                
+        self.changed = True
+        
+    def update(self, comment):
+        """
+        (Re)index a comment if its file changed. Returns True if it was indexed.
+        
+        Comments loaded here stay loaded, so rendering them later doesn't
+        read the file again.
+        """
+        key = f"{comment.thread.slug}/{comment.uid}"
+        self.seen.add(key)
+        
+        try:
+            stat = os.stat(comment.path)
+        except FileNotFoundError:
+            self.remove(key)
+            return False
+            
+        signature = [stat.st_mtime_ns, stat.st_size]
+        
+        if key in self.docs and self.docs[key]["signature"] == signature:
+            return False
+            
+        self.remove(key)
+        
+        comment.load(ignore_errors=True)
+        date = comment.metadata.get("date")
+        
+        self._add(key, {
+            "signature": signature,
+            "author": comment.metadata.get("author", ""),
+            "date": date.isoformat() if date is not None else "",
+            "words": sorted(tokenize(comment.content))
+        })
+        
+        self.changed = True
+        
+        return True
+        
+    def prune(self):
+        """
+        Remove comments that weren't seen by update() (they're gone).
+        """
+        for key in set(self.docs).difference(self.seen):
+            self.remove(key)
+            
+    def search(self, text="", author=None, since=None, until=None):
+        """
+        Return the keys of comments containing every word in text, by the
+        given author and dated between since and until (ISO date strings,
+        inclusive), newest first.
+        """
+        sets = [self.postings.get(x, set()) for x in tokenize(text)]
+        
+        if author is not None:
+            sets.append(self.authors.get(author.lower(), set()))
+            
+        if sets:
+            sets.sort(key=len)
+            found = set(sets[0]).intersection(*sets[1:])
+        else:
+            found = set(self.docs)
+            
+        if since is not None:
+            found = {x for x in found if self.docs[x]["date"] >= since}
+            
+        if until is not None:
+            found = {x for x in found if self.docs[x]["date"][:len(until)] <= until}
+            
+        return sorted(found, key=lambda x: (self.docs[x]["date"], x), reverse=True)
+        
+    def facets(self):
+        """
+        Number of comments per author and per month.
+        """
+        return {
+            "author": Counter(x["author"] for x in self.docs.values()),
+            "month": Counter(x["date"][:7] for x in self.docs.values() if x["date"])
+        }
+        
+    def write_shards(self, path, urls=None):
+        """
+        Write the index as JSON files for client-side search (see module docs).
+        
+        urls maps slugs to the url of their article.
+        """
+        urls = urls or {}
+        numbers = {}
+        docs = []
+        
+        for number, key in enumerate(sorted(self.docs)):
+            slug, uid = key.split("/", 1)
+            doc = self.docs[key]
+            numbers[key] = number
+            url = f"{urls[slug]}#comment-{uid}" if slug in urls else None
+            docs.append([slug, uid, doc["author"], doc["date"], url])
+            
+        shards = defaultdict(dict)
+        for word, keys in self.postings.items():
+            shards[word[:2]][word] = sorted(numbers[x] for x in keys)
+            
+        # document numbers change between builds, shards for prefixes that
+        # are gone would point at the wrong comments
+        shutil.rmtree(os.path.join(path, "words"), ignore_errors=True)
+        os.makedirs(os.path.join(path, "words"))
+        
+        with open(os.path.join(path, "docs.json"), "w", encoding="utf-8") as fp:
+            json.dump(docs, fp, separators=(",", ":"))
+            
+        for prefix, words in shards.items():
+            with open(os.path.join(path, "words", f"{prefix}.json"), "w", encoding="utf-8") as fp:
+                json.dump(words, fp, separators=(",", ":"))
+
+def open_index(settings):
+    """
+    Return the loaded Index for the given settings, or None if disabled.
+    """
+    path = settings.get('COMMENTS_SEARCH_INDEX', config.defaults['COMMENTS_SEARCH_INDEX'])
+    
+    if not path:
+        return None
+        
+    index = Index(path)
+    index.load()
+    
+    return index
+
+def write_shards(article_generator, writer):
+    """
+    Write the client-side shards of the index built by inject_comments.
+    """
+    index = getattr(article_generator, "comments_index", None)
+    shards = article_generator.settings.get('COMMENTS_SEARCH_SHARDS', config.defaults['COMMENTS_SEARCH_SHARDS'])
+    
+    if index is None or not shards:
+        return
+        
+    urls = {x.slug: x.url for x in article_generator.articles}
+    
+    index.write_shards(os.path.join(writer.output_path, shards), urls)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search comments.")
+    parser.add_argument("index", help="index file (COMMENTS_SEARCH_INDEX)")
+    parser.add_argument("words", nargs="*", help="words the comments must contain")
+    parser.add_argument("--author", help="only comments by this author")
+    parser.add_argument("--since", help="only comments from this date (YYYY-MM-DD) on")
+    parser.add_argument("--until", help="only comments up to this date (YYYY-MM-DD)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    
+    args = parser.parse_args(argv)
+    
+    index = Index(args.index)
+    index.load()
+    
+    for key in index.search(" ".join(args.words), args.author, args.since, args.until):
+        doc = index.docs[key]
+        
+        if args.json:
+            slug, uid = key.split("/", 1)
+            print(json.dumps({"slug": slug, "uid": uid, "author": doc["author"], "date": doc["date"]}))
+        else:
+            print(f"{doc['date'] or '????-??-??'}\t{doc['author'] or 'Unknown'}\t{key}")
+
+if __name__ == "__main__":
+    sys.exit(main())
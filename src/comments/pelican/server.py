@@ -0,0 +1,334 @@
+"""
+Small HTTP service that accepts new comments.
+
+Usage:
+    python -m comments.pelican.server /blog/path/comments [--host 127.0.0.1] [--port 8000]
+
+POST /<slug> with a form-encoded or JSON body:
+    content: markdown source of the comment (required)
+    author: name of the commenter
+    parent: uid of the comment being replied to
+
+Responds with 201 and {"slug": ..., "uid": ...} once the comment is on disk.
+
+Threads that receive comments are kept in memory (up to max_threads of them).
+Submissions are queued per slug, and written in batches by one worker per
+slug: every comment file, then the .thread file once for the whole batch.
+Files are written to a temporary file and renamed into place (see
+data.atomic_write), so the site can be built while comments come in.
+
+TODO: authentication, spam filtering, rate limiting.
+"""
+
+import re
+import sys
+import json
+import asyncio
+import argparse
+import arrow
+from collections import OrderedDict
+from urllib.parse import parse_qs
+from . import data, errors
+
+SLUG = re.compile(r"^/([A-Za-z0-9_-]+)/?$")
+
+STATUS = {
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+class HTTPError(Exception):
+    """
+    Ends a request with an error response. With close=True, the connection is
+    closed afterwards (when the rest of the request can't be read reliably).
+    """
+    def __init__(self, status, message, close=False):
+        super().__init__(message)
+        self.status = status
+        self.close = close
+
+class Intake:
+    """
+    Queues submissions per slug and writes them out in batches.
+    
+    batch: most comments written per .thread write
+    delay: seconds to wait for more submissions before writing a batch
+    """
+    def __init__(self, base_path, batch=100, delay=0.01, max_threads=128, max_body=64*1024, **config):
+        self.config = dict(config, COMMENTS_PATH=base_path)
+        self.batch = batch
+        self.delay = delay
+        self.max_threads = max_threads
+        self.max_body = max_body
+        
+        # slug -> Thread, least recently used first
+        self.threads = OrderedDict()
+        self.queues = {}
+        self.workers = {}
+        
+    def open(self, slug):
+        """
+        Load a thread (and the uids in use) from disk.
+        """
+        thread = data.Thread(slug, **self.config)
+        
+        try:
+            thread.load()
+        except FileNotFoundError:
+            pass
+            
+        thread.uids.load()
+        
+        return thread
+        
+    async def thread(self, slug):
+        """
+        Return the in-memory thread for the slug, loading it if needed.
+        
+        Only called from a slug's worker, so a thread is never evicted
+        while it's being written.
+        """
+        if slug in self.threads:
+            self.threads.move_to_end(slug)
+            return self.threads[slug]
+            
+        loop = asyncio.get_running_loop()
+        thread = await loop.run_in_executor(None, self.open, slug)
+        
+        self.threads[slug] = thread
+        
+        for idle in list(self.threads):
+            if len(self.threads) <= self.max_threads:
+                break
+            if idle not in self.workers:
+                del self.threads[idle]
+                
+        return thread
+        
+    def submit(self, slug, content, author=None, parent=None):
+        """
+        Queue a comment, returns a future that resolves to its uid.
+        """
+        future = asyncio.get_running_loop().create_future()
+        
+        queue = self.queues.setdefault(slug, asyncio.Queue())
+        queue.put_nowait(({'content': content, 'author': author, 'parent': parent}, future))
+        
+        if slug not in self.workers:
+            self.workers[slug] = asyncio.create_task(self.work(slug))
+            
+        return future
+        
+    async def work(self, slug):
+        """
+        Write out everything queued for a slug, a batch at a time, until
+        the queue is empty.
+        """
+        queue = self.queues[slug]
+        loop = asyncio.get_running_loop()
+        
+        try:
+            while not queue.empty():
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                    
+                batch = []
+                while not queue.empty() and len(batch) < self.batch:
+                    batch.append(queue.get_nowait())
+                    
+                try:
+                    thread = await self.thread(slug)
+                    results = await loop.run_in_executor(None, self.flush, thread, [x[0] for x in batch])
+                except Exception as exc:
+                    # whatever is in memory may not match the disk anymore
+                    self.threads.pop(slug, None)
+                    results = [exc] * len(batch)
+                    
+                for (_, future), result in zip(batch, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+        finally:
+            del self.workers[slug]
+            del self.queues[slug]
+            
+    def flush(self, thread, submissions):
+        """
+        Add a batch of submissions to a thread, write each comment and then
+        the thread once.
+        
+        Returns a uid, or an exception, for each submission. A submission
+        that fails doesn't stop the rest of the batch from being written.
+        """
+        results = []
+        date = arrow.utcnow().datetime
+        
+        for submission in submissions:
+            parent = submission['parent']
+            if parent and parent not in thread.uids.uids:
+                results.append(errors.ParentNotFound(f"Comment {parent} not found"))
+                continue
+                
+            comment = thread.add(parent=parent or None)
+            
+            if submission['author']:
+                comment.metadata['author'] = submission['author']
+            comment.metadata['date'] = date
+            
+            try:
+                comment.save(submission['content'])
+            except Exception as exc:
+                # just added, so no replies hang off it yet
+                thread.comments.remove(comment)
+                thread.reindex()
+                results.append(exc)
+                continue
+                
+            results.append(comment.uid)
+            
+        if any(isinstance(x, str) for x in results):
+            thread.save()
+        
+        return results
+        
+    async def handle(self, reader, writer):
+        """
+        Serve HTTP requests on a connection, keeping it open if the client
+        allows it.
+        """
+        try:
+            while True:
+                request = await reader.readline()
+                if not request:
+                    break
+                    
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                    
+                try:
+                    method, target, version = request.decode("latin-1").split()
+                except ValueError:
+                    break
+                    
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                
+                try:
+                    status, body = await self.respond(method, target, headers, reader)
+                except HTTPError as exc:
+                    status, body = exc.status, {"error": str(exc)}
+                    keep_alive = keep_alive and not exc.close
+                    
+                payload = json.dumps(body).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + payload)
+                await writer.drain()
+                
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            
+    async def respond(self, method, target, headers, reader):
+        """
+        Handle a single request, returns (status, body).
+        """
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            length = -1
+            
+        if length < 0:
+            raise HTTPError(400, "Invalid Content-Length", close=True)
+            
+        if length > self.max_body:
+            raise HTTPError(413, f"Comments are limited to {self.max_body} bytes", close=True)
+            
+        raw = await reader.readexactly(length) if length else b""
+        
+        match = SLUG.match(target.split("?", 1)[0])
+        if match is None:
+            raise HTTPError(404, f"Not found: {target}")
+            
+        if method != "POST":
+            raise HTTPError(405, "Use POST to submit a comment")
+            
+        slug = match.group(1)
+        fields = self.parse(headers.get("content-type", ""), raw)
+        
+        if not fields.get("content", "").strip():
+            raise HTTPError(400, "A comment needs content")
+            
+        try:
+            uid = await self.submit(slug, fields["content"], fields.get("author"), fields.get("parent"))
+        except errors.ParentNotFound as exc:
+            raise HTTPError(400, str(exc))
+        except Exception as exc:
+            raise HTTPError(500, f"Comment could not be saved: {exc}")
+            
+        return 201, {"slug": slug, "uid": uid}
+        
+    def parse(self, content_type, raw):
+        """
+        Return the submitted fields as a dictionary of strings.
+        """
+        try:
+            text = raw.decode("utf-8")
+            
+            if content_type.startswith("application/json"):
+                fields = json.loads(text)
+                if not isinstance(fields, dict):
+                    raise ValueError("expected an object")
+                return {key: str(value) for key, value in fields.items() if value is not None}
+            else:
+                return {key: values[0] for key, values in parse_qs(text).items()}
+        except ValueError as exc:
+            raise HTTPError(400, f"Malformed submission: {exc}")
+            
+    async def serve(self, host="127.0.0.1", port=8000):
+        return await asyncio.start_server(self.handle, host, port)
+
+async def run(args):
+    intake = Intake(args.path, batch=args.batch, delay=args.delay, COMMENTS_SHARD_DEPTH=args.shard_depth)
+    server = await intake.serve(args.host, args.port)
+    
+    host, port = server.sockets[0].getsockname()[:2]
+    print(f"Listening on http://{host}:{port}/", flush=True)
+    
+    async with server:
+        await server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Accept new comments over HTTP.")
+    parser.add_argument("path", help="comments directory (COMMENTS_PATH)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--batch", type=int, default=100, help="most comments written per .thread write")
+    parser.add_argument("--delay", type=float, default=0.01, help="seconds to wait for a batch to fill up")
+    parser.add_argument("--shard-depth", type=int, default=0, help="COMMENTS_SHARD_DEPTH of the comments directory")
+    
+    args = parser.parse_args(argv)
+    
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    sys.exit(main())
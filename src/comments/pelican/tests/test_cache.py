@@ -0,0 +1,79 @@
+"""
+Testing comments.pelican.cache and its use by Comment.
+"""
+
+import pytest
+from comments.pelican import data, cache
+
+@pytest.fixture()
+def renders():
+    """
+    Start with an empty global render cache.
+    """
+    cache.renders.clear()
+    yield cache.renders
+    cache.renders.clear()
+
+def test_render_once(fake_comments, renders):
+    """
+    A comment is rendered once per format, then served from the cache.
+    """
+    thread = data.Thread("article-1", COMMENTS_PATH=fake_comments)
+    comment = data.Comment(thread, 1, 3, "jdycemcr", "jgpskmuex")
+    
+    html = comment.html
+    
+    assert html.startswith("<h1>Hello World</h1>")
+    assert comment.html is html
+    assert comment.parse("html5") is html
+    
+    comment.parse("xhtml")
+    
+    assert (renders.hits, renders.misses) == (2, 2)
+    assert len(renders) == 1
+    
+def test_save_invalidates(fake_comments, renders):
+    """
+    Saving new content drops the cached output.
+    """
+    thread = data.Thread("test-cache", COMMENTS_PATH=fake_comments)
+    comment = data.Comment(thread, uid="cached")
+    
+    comment.save("# Before")
+    assert comment.parse() == "<h1>Before</h1>"
+    
+    comment.save("# After")
+    assert comment.parse() == "<h1>After</h1>"
+    
+def test_eviction():
+    """
+    Least recently used comments are dropped to stay under maxsize.
+    """
+    renders = cache.RenderCache(maxsize=10)
+    
+    renders.put("a", "html5", "aaaa")
+    renders.put("b", "html5", "bbbb")
+    renders.get("a", "html5", lambda: "unused")
+    renders.put("c", "html5", "cccc")
+    
+    assert list(renders.entries) == ["a", "c"]
+    assert renders.info() == cache.CacheInfo(hits=1, misses=0, evictions=1, size=8, maxsize=10)
+    
+    renders.put("d", "html5", "d"*11)
+    
+    assert "d" not in renders.entries
+    
+def test_resize():
+    """
+    Shrinking maxsize evicts what no longer fits.
+    """
+    renders = cache.RenderCache(maxsize=12)
+    
+    renders.put("a", "html5", "aaaa")
+    renders.put("b", "html5", "bbbb")
+    renders.put("c", "html5", "cccc")
+    
+    renders.resize(8)
+    
+    assert list(renders.entries) == ["b", "c"]
+    assert renders.info() == cache.CacheInfo(hits=0, misses=0, evictions=1, size=8, maxsize=8)
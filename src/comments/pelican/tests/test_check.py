@@ -0,0 +1,148 @@
+"""
+Testing comments.pelican.check
+"""
+
+import os
+import shutil
+from comments.pelican import check, reshard
+
+def broken_site(path):
+    """
+    Write a thread with one of each kind of issue.
+    """
+    os.makedirs(os.path.join(path, "broken"))
+    
+    for uid in ("top", "reply", "orphan", "stray"):
+        with open(os.path.join(path, "broken", f"{uid}.md"), "w") as fp:
+            fp.write("author: Someone\n\nHi\n")
+    
+    with open(os.path.join(path, "broken.thread"), "w") as fp:
+        fp.write("0\t0\ttop\t\n"
+                 "2\t1\treply\ttop\n"
+                 "1\t2\torphan\tgone\n"
+                 "0\t3\tdeleted\t\n"
+                 "0\t4\ttop\t\n"
+                 "nonsense\n")
+    
+    return path
+
+def issues(found):
+    return sorted((x["uid"], x["issue"]) for x in found)
+
+def test_check_typical(fake_comments):
+    """
+    A consistent thread has no issues.
+    """
+    assert check.check_thread(fake_comments, "article-1") == []
+    
+def test_check_thread_issues(tmp_path):
+    """
+    Report every kind of issue, without changing anything.
+    """
+    path = broken_site(str(tmp_path))
+    
+    with open(os.path.join(path, "broken.thread")) as fp:
+        before = fp.read()
+    
+    assert issues(check.check_thread(path, "broken")) == [
+        ("6", "malformed"),
+        ("deleted", "missing"),
+        ("orphan", "level"),
+        ("orphan", "orphan"),
+        ("reply", "level"),
+        ("stray", "stray"),
+        ("top", "duplicate"),
+    ]
+    
+    with open(os.path.join(path, "broken.thread")) as fp:
+        assert fp.read() == before
+    
+def test_check_fix(tmp_path):
+    """
+    Rewrite the thread, leaving only what can't be fixed.
+    """
+    path = broken_site(str(tmp_path))
+    
+    found = check.check_thread(path, "broken", fix=True)
+    
+    assert [(x["uid"], x["issue"]) for x in found if not x["fixed"]] == [("deleted", "missing")]
+    
+    with open(os.path.join(path, "broken.thread")) as fp:
+        assert fp.read() == "0\t0\ttop\t\n1\t1\treply\ttop\n0\t2\torphan\t\n0\t3\tdeleted\t\n0\t4\tstray\t\n"
+    
+    assert issues(check.check_thread(path, "broken")) == [("deleted", "missing")]
+    
+def test_check_site(tmp_path):
+    """
+    Check every slug in a comments directory, including comments with no thread.
+    """
+    path = broken_site(str(tmp_path))
+    os.makedirs(os.path.join(path, "no-thread"))
+    open(os.path.join(path, "no-thread", "lonely.md"), "w").close()
+    
+    found = issues(check.check(path, jobs=2))
+    
+    assert ("lonely", "stray") in found
+    assert len(found) == 8
+    
+def test_check_misplaced(fake_comments, tmp_path):
+    """
+    Comment files outside of the shard directory they belong in are reported.
+    """
+    shutil.copytree(fake_comments, tmp_path, dirs_exist_ok=True)
+    path = str(tmp_path)
+    
+    assert check.check_thread(path, "article-1") == []
+    assert issues(check.check_thread(path, "article-1", shard_depth=1)) == [
+        ("ejzizpcog", "misplaced"),
+        ("jdycemcr", "misplaced"),
+        ("jgpskmuex", "misplaced"),
+    ]
+    
+    reshard.reshard_slug(path, "article-1", 1)
+    
+    assert check.check_thread(path, "article-1", shard_depth=1) == []
+    assert issues(check.check_thread(path, "article-1")) == [
+        ("ejzizpcog", "misplaced"),
+        ("jdycemcr", "misplaced"),
+        ("jgpskmuex", "misplaced"),
+    ]
+    
+def test_check_cycle(tmp_path):
+    """
+    Comments that are their own ancestors are reported, and --fix breaks the cycle.
+    """
+    path = str(tmp_path)
+    os.makedirs(os.path.join(path, "cycle"))
+    
+    for uid in ("a", "b"):
+        open(os.path.join(path, "cycle", f"{uid}.md"), "w").close()
+    
+    with open(os.path.join(path, "cycle.thread"), "w") as fp:
+        fp.write("1\t0\ta\tb\n1\t1\tb\ta\n")
+    
+    assert issues(check.check_thread(path, "cycle")) == [("b", "cycle"), ("b", "level")]
+    
+    check.check_thread(path, "cycle", fix=True)
+    
+    with open(os.path.join(path, "cycle.thread")) as fp:
+        assert fp.read() == "1\t0\ta\tb\n0\t1\tb\t\n"
+    
+    assert check.check_thread(path, "cycle") == []
+    
+def test_check_long_chain(tmp_path):
+    """
+    A long chain of replies is checked in linear time.
+    """
+    path = str(tmp_path)
+    os.makedirs(os.path.join(path, "chain"))
+    
+    with open(os.path.join(path, "chain.thread"), "w") as fp:
+        fp.write("0\t0\tc0\t\n")
+        for x in range(1, 50000):
+            fp.write(f"{x}\t{x}\tc{x}\tc{x-1}\n")
+    
+    found = check.check_thread(path, "chain")
+    
+    assert len(found) == 50000
+    assert {x["issue"] for x in found} == {"missing"}
@@ -126,4 +126,39 @@ def test_load_randomized_thread(fake_comments, fixed_seed):
             ('first-3', 1, 2),
             ('first-2', 1, 1)
     ]
-    
\ No newline at end of file
+        
+def test_load_comment_mapped(fake_comments):
+    """
+    Loading through mmap gives the same result as reading the file.
+    """
+    thread = data.Thread("article-1", COMMENTS_PATH=fake_comments)
+    
+    read = data.Comment(thread, uid="ejzizpcog")
+    read.load()
+    
+    mapped = data.Comment(thread, uid="ejzizpcog")
+    mapped.mmap_threshold = 1
+    mapped.load()
+    
+    assert mapped.metadata == read.metadata
+    assert mapped.content == read.content
+    assert mapped.content.startswith("# Iphis tangit\n")
+    
+def test_sharded_layout(fake_comments, fixed_seed):
+    """
+    With COMMENTS_SHARD_DEPTH, comments are saved and loaded in subdirectories.
+    """
+    thread = data.Thread("test-sharded", COMMENTS_PATH=fake_comments, COMMENTS_SHARD_DEPTH=2)
+    
+    comment = thread.add(uid="abcdefg")
+    comment.save("# Sharded")
+    
+    assert comment.path == os.path.join(fake_comments, "test-sharded", "ab", "cd", "abcdefg.md")
+    assert os.path.exists(comment.path)
+    
+    loaded = data.Comment(thread, uid="abcdefg")
+    loaded.load()
+    assert loaded.content == "# Sharded"
+    
+    thread.uids.load()
+    assert thread.uids.uids == {"abcdefg"}
@@ -0,0 +1,83 @@
+"""
+Testing comments.pelican.feeds
+"""
+
+import os
+import arrow
+from pelican.writers import Writer
+from comments.pelican import data, feeds
+
+class Article:
+    """
+    Just enough of a pelican article.
+    """
+    def __init__(self, thread):
+        self.slug = thread.slug
+        self.title = thread.slug.title()
+        self.url = f"{thread.slug}.html"
+        self.comments = thread
+        
+class Generator:
+    """
+    Just enough of a pelican article generator.
+    """
+    def __init__(self, articles):
+        self.articles = articles
+        self.settings = {}
+        self.context = {'SITENAME': "Test", 'SITEURL': "http://example.com", 'FEED_DOMAIN': "http://example.com"}
+
+def dated_thread(fake_comments, slug, dates):
+    thread = data.Thread(slug, COMMENTS_PATH=fake_comments)
+    
+    for index, date in enumerate(dates):
+        comment = thread.add(uid=f"{slug}-{index}", order=index)
+        comment.metadata['author'] = "Someone"
+        comment.metadata['date'] = arrow.get(date).datetime
+        comment.save(f"Comment number {index}")
+        
+    thread.save()
+    
+    thread = data.Thread(slug, COMMENTS_PATH=fake_comments)
+    thread.load()
+    
+    return thread
+
+def test_newest_reads_only_headers(fake_comments):
+    """
+    Pick the newest comments of a thread, without loading the others.
+    """
+    thread = data.Thread("article-1", COMMENTS_PATH=fake_comments)
+    thread.load()
+    
+    entries = feeds.newest(Article(thread), 1)
+    
+    assert [x.comment.uid for x in entries] == ["jdycemcr"]
+    assert not any(x._loaded for x in thread)
+    
+def test_latest_merges_threads(fake_comments):
+    """
+    The most recent comments across several threads, newest first.
+    """
+    first = dated_thread(fake_comments, "feed-1", ["2020-01-01", "2020-01-05", "2020-01-03"])
+    second = dated_thread(fake_comments, "feed-2", ["2020-01-04", "2020-01-02"])
+    
+    streams = [feeds.newest(Article(x), 3) for x in (first, second)]
+    
+    assert [x.comment.uid for x in feeds.latest(streams, 3)] == ["feed-1-1", "feed-2-0", "feed-1-2"]
+    
+def test_write_feeds(fake_comments, tmp_path):
+    """
+    Write out per-article and site-wide atom feeds.
+    """
+    thread = dated_thread(fake_comments, "feed-3", ["2020-02-01", "2020-02-02"])
+    
+    writer = Writer(str(tmp_path), settings={'FEED_APPEND_REF': False, 'FEED_MAX_ITEMS': None})
+    
+    feeds.write_feeds(Generator([Article(thread)]), writer)
+    
+    with open(os.path.join(tmp_path, "feeds", "comments.atom.xml")) as fp:
+        site = fp.read()
+    
+    assert "http://example.com/feed-3.html#comment-feed-3-1" in site
+    assert "&lt;p&gt;Comment number 1&lt;/p&gt;" in site
+    assert os.path.exists(os.path.join(tmp_path, "feeds", "comments", "feed-3.atom.xml"))
@@ -0,0 +1,98 @@
+"""
+Testing comments.pelican.render: every renderer should produce the same HTML
+as Python-Markdown for the sample comments.
+"""
+
+import os
+import glob
+import logging
+import pytest
+from html.parser import HTMLParser
+from comments.pelican import render
+
+SAMPLES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "comments", "*", "*.md")))
+
+# (renderer, sample): reason, for differences between markdown dialects
+DIFFERENCES = {
+    ("cmark", "vrvtvjtkx.md"): "CommonMark headings need a space after #",
+    ("markdown-it", "vrvtvjtkx.md"): "CommonMark headings need a space after #",
+    ("mistune", "vrvtvjtkx.md"): "mistune headings need a space after #",
+}
+
+class Structure(HTMLParser):
+    """
+    Reduces HTML to its tags, attributes and text, ignoring differences in
+    whitespace, entities and self-closing tags.
+    """
+    def __init__(self, html):
+        super().__init__()
+        self.parts = []
+        self.feed(html)
+        self.close()
+        
+    def handle_starttag(self, tag, attrs):
+        self.parts.append(("start", tag, sorted(attrs)))
+        
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        
+    def handle_endtag(self, tag):
+        self.parts.append(("end", tag))
+        
+    def handle_data(self, data):
+        text = " ".join(data.split())
+        if text:
+            self.parts.append(("text", text))
+
+def cases():
+    for name in render.renderers:
+        if name == "markdown":
+            continue
+        
+        for sample in SAMPLES:
+            reason = DIFFERENCES.get((name, os.path.basename(sample)))
+            marks = [pytest.mark.xfail(reason=reason, strict=True)] if reason else []
+            
+            yield pytest.param(name, sample, marks=marks, id=f"{name}-{os.path.basename(sample)}")
+
+@pytest.mark.parametrize("name,sample", list(cases()))
+def test_conformance(name, sample):
+    """
+    Compare a renderer with Python-Markdown.
+    """
+    try:
+        renderer = render.renderers[name]()
+    except ImportError:
+        pytest.skip(f"{name} isn't installed")
+    
+    with open(sample, encoding="utf-8") as fp:
+        source = fp.read().split("\n\n", 1)[1]
+    
+    expected = render.MarkdownRenderer().render(source)
+    
+    assert Structure(renderer.render(source)).parts == Structure(expected).parts
+    
+def test_fallback(caplog):
+    """
+    Unknown renderers fall back to Python-Markdown, with a warning.
+    """
+    with caplog.at_level(logging.WARNING):
+        renderer = render.get("no-such-renderer")
+    
+    assert renderer.name == "markdown"
+    assert "no-such-renderer" in caplog.text
+    
+def test_unavailable(monkeypatch):
+    """
+    Renderers whose package is missing fall back to Python-Markdown.
+    """
+    class Missing(render.Renderer):
+        name = "missing"
+        
+        def __init__(self):
+            import no_such_package
+    
+    monkeypatch.setitem(render.renderers, "missing", Missing)
+    monkeypatch.delitem(render._instances, "missing", raising=False)
+    
+    assert render.get("missing").name == "markdown"
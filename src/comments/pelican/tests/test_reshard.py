@@ -0,0 +1,64 @@
+"""
+Testing comments.pelican.reshard
+"""
+
+import os
+import shutil
+from comments.pelican import data, reshard
+
+def test_reshard_and_back(fake_comments, tmp_path):
+    """
+    Move a flat comment directory into shards and back again.
+    """
+    path = str(tmp_path)
+    shutil.copytree(os.path.join(fake_comments, "article-2"), os.path.join(path, "article-2"))
+    
+    flat = sorted(os.listdir(os.path.join(path, "article-2")))
+    
+    assert list(reshard.reshard(path, 1, jobs=1)) == [("article-2", 5, [])]
+    
+    thread = data.Thread("article-2", COMMENTS_PATH=path, COMMENTS_SHARD_DEPTH=1)
+    assert os.path.exists(os.path.join(path, "article-2", "yj", "yjeuodfpw.md"))
+    assert sorted(uid for uid, _ in thread.comment_files()) == [x[:-3] for x in flat]
+    
+    comment = data.Comment(thread, uid="yjeuodfpw")
+    comment.load()
+    assert "author" in comment.metadata
+    
+    assert list(reshard.reshard(path, 1, jobs=1)) == [("article-2", 0, [])]
+    assert list(reshard.reshard(path, 0, jobs=1)) == [("article-2", 5, [])]
+    assert sorted(os.listdir(os.path.join(path, "article-2"))) == flat
+    
+def test_reshard_conflict(fake_comments, tmp_path):
+    """
+    A file whose target exists is left alone and reported, not overwritten.
+    """
+    path = str(tmp_path)
+    shutil.copytree(os.path.join(fake_comments, "article-2"), os.path.join(path, "article-2"))
+    
+    os.makedirs(os.path.join(path, "article-2", "yj"))
+    with open(os.path.join(path, "article-2", "yj", "yjeuodfpw.md"), "w") as fp:
+        fp.write("Restored copy\n")
+        
+    flat = os.path.join(path, "article-2", "yjeuodfpw.md")
+    
+    assert list(reshard.reshard(path, 1, jobs=1)) == [("article-2", 4, [flat])]
+    
+    with open(os.path.join(path, "article-2", "yj", "yjeuodfpw.md")) as fp:
+        assert fp.read() == "Restored copy\n"
+        
+    assert os.path.exists(flat)
+    
+def test_reshard_interrupted(fake_comments, tmp_path):
+    """
+    A file linked into place by an interrupted run is finished off.
+    """
+    path = str(tmp_path)
+    shutil.copytree(os.path.join(fake_comments, "article-2"), os.path.join(path, "article-2"))
+    
+    flat = os.path.join(path, "article-2", "yjeuodfpw.md")
+    os.makedirs(os.path.join(path, "article-2", "yj"))
+    os.link(flat, os.path.join(path, "article-2", "yj", "yjeuodfpw.md"))
+    
+    assert list(reshard.reshard(path, 1, jobs=1)) == [("article-2", 5, [])]
+    assert not os.path.exists(flat)
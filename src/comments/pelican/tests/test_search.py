@@ -0,0 +1,116 @@
+"""
+Testing comments.pelican.search
+"""
+
+import os
+import json
+import shutil
+from comments.pelican import data, search
+
+def build(path, index_path):
+    """
+    Index article-1, the way inject_comments does.
+    """
+    index = search.Index(index_path)
+    index.load()
+    
+    thread = data.Thread("article-1", COMMENTS_PATH=path)
+    thread.load()
+    
+    updated = [index.update(x) for x in thread]
+    index.prune()
+    index.save()
+    
+    return index, updated
+
+def test_search(fake_comments, tmp_path):
+    """
+    Find comments by words, author and date.
+    """
+    index, updated = build(fake_comments, os.path.join(tmp_path, "index.json.gz"))
+    
+    assert updated == [True, True, True]
+    assert index.search("hello world") == ["article-1/jdycemcr"]
+    assert index.search("lorem markdownum") == ["article-1/jgpskmuex", "article-1/ejzizpcog"]
+    assert index.search("lorem", author="archie nguen") == ["article-1/ejzizpcog"]
+    assert index.search(since="2016-02-11T23:40:21") == ["article-1/jdycemcr"]
+    assert index.search(until="2016-02-10") == []
+    assert index.search("nonexistent") == []
+    assert index.facets()["month"] == {"2016-02": 3}
+    
+def test_incremental(fake_comments, tmp_path):
+    """
+    Only changed comments are read again, removed ones are dropped.
+    """
+    path = os.path.join(tmp_path, "comments")
+    shutil.copytree(fake_comments, path)
+    index_path = os.path.join(tmp_path, "index.json.gz")
+    
+    build(path, index_path)
+    
+    with open(os.path.join(path, "article-1", "jdycemcr.md"), "a") as fp:
+        fp.write("\n\nEdited later.")
+    os.remove(os.path.join(path, "article-1", "ejzizpcog.md"))
+    
+    index, updated = build(path, index_path)
+    
+    assert updated == [False, True, False]
+    assert index.search("edited") == ["article-1/jdycemcr"]
+    assert "article-1/ejzizpcog" not in index.docs
+    assert index.search("iphis") == []
+    
+def test_write_shards(fake_comments, tmp_path):
+    """
+    Write the index out for client-side search.
+    """
+    index, _ = build(fake_comments, os.path.join(tmp_path, "index.json.gz"))
+    
+    index.write_shards(os.path.join(tmp_path, "search"), {"article-1": "article-1.html"})
+    
+    with open(os.path.join(tmp_path, "search", "docs.json")) as fp:
+        docs = json.load(fp)
+    
+    with open(os.path.join(tmp_path, "search", "words", "he.json")) as fp:
+        words = json.load(fp)
+    
+    assert [docs[x][4] for x in words["hello"]] == ["article-1.html#comment-jdycemcr"]
+    
+def test_write_shards_stale(fake_comments, tmp_path):
+    """
+    Shards of prefixes that are no longer in the index are removed.
+    """
+    index, _ = build(fake_comments, os.path.join(tmp_path, "index.json.gz"))
+    words = os.path.join(tmp_path, "search", "words")
+    
+    os.makedirs(words)
+    with open(os.path.join(words, "zz.json"), "w") as fp:
+        json.dump({"zzz": [0]}, fp)
+        
+    index.write_shards(os.path.join(tmp_path, "search"))
+    
+    assert "zz.json" not in os.listdir(words)
+    assert "he.json" in os.listdir(words)
+    
+def test_save_failure(fake_comments, tmp_path, monkeypatch):
+    """
+    A failed save leaves the previous index, and no temporary files, behind.
+    """
+    index_path = os.path.join(tmp_path, "index.json.gz")
+    index, _ = build(fake_comments, index_path)
+    
+    def fail(*args, **kwargs):
+        raise ValueError("can't serialize")
+    
+    index.changed = True
+    monkeypatch.setattr(json, "dump", fail)
+    
+    try:
+        index.save()
+    except ValueError:
+        pass
+    
+    assert os.listdir(tmp_path) == ["index.json.gz"]
+    
+    reloaded = search.Index(index_path)
+    reloaded.load()
+    assert reloaded.docs == index.docs
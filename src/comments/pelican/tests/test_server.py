@@ -0,0 +1,140 @@
+"""
+Testing comments.pelican.server
+"""
+
+import json
+import asyncio
+from comments.pelican import server, data
+
+async def post(port, slug, body):
+    """
+    Submit a comment, returns (status, response body).
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    
+    payload = json.dumps(body).encode("utf-8")
+    writer.write(f"POST /{slug} HTTP/1.1\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload)
+    
+    status = int((await reader.readline()).split()[1])
+    response = await reader.read()
+    writer.close()
+    
+    return status, json.loads(response.split(b"\r\n\r\n", 1)[1])
+
+def test_batched_submissions(tmp_path, monkeypatch):
+    """
+    Concurrent submissions to a slug are written with a few .thread writes.
+    """
+    saves = []
+    save = data.Thread.save
+    monkeypatch.setattr(data.Thread, "save", lambda self: saves.append(self.slug) or save(self))
+    
+    async def scenario():
+        intake = server.Intake(str(tmp_path), delay=0.05)
+        listening = await intake.serve(port=0)
+        port = listening.sockets[0].getsockname()[1]
+        
+        status, first = await post(port, "post", {"content": "First!", "author": "Someone"})
+        
+        replies = await asyncio.gather(*[
+            post(port, "post", {"content": f"Reply {x}", "parent": first["uid"]}) for x in range(20)
+        ])
+        
+        listening.close()
+        await listening.wait_closed()
+        
+        return status, first, replies
+    
+    status, first, replies = asyncio.run(scenario())
+    
+    assert status == 201
+    assert all(status == 201 for status, _ in replies)
+    assert len(saves) < 5
+    
+    thread = data.Thread("post", COMMENTS_PATH=str(tmp_path))
+    thread.load()
+    
+    assert len(thread.comments) == 21
+    assert thread.comments[0].uid == first["uid"]
+    assert thread.comments[0].descendants == 20
+    
+def test_failed_save(tmp_path, monkeypatch):
+    """
+    A comment that can't be written fails on its own, the rest of its batch
+    is saved.
+    """
+    save = data.Comment.save
+    
+    def failing(self, content=None):
+        if content == "Fail":
+            raise OSError("disk full")
+        return save(self, content)
+        
+    monkeypatch.setattr(data.Comment, "save", failing)
+    
+    intake = server.Intake(str(tmp_path))
+    thread = intake.open("post")
+    
+    results = intake.flush(thread, [
+        {"content": "First", "author": None, "parent": None},
+        {"content": "Fail", "author": None, "parent": None},
+        {"content": "Last", "author": None, "parent": None},
+    ])
+    
+    assert isinstance(results[1], OSError)
+    
+    saved = data.Thread("post", COMMENTS_PATH=str(tmp_path))
+    saved.load()
+    
+    assert [x.uid for x in saved] == [results[0], results[2]]
+    assert sorted(uid for uid, _ in saved.comment_files()) == sorted([results[0], results[2]])
+    
+def test_bad_submissions(tmp_path):
+    """
+    Missing content, or a reply to an unknown comment, are refused.
+    """
+    async def scenario():
+        intake = server.Intake(str(tmp_path), delay=0)
+        listening = await intake.serve(port=0)
+        port = listening.sockets[0].getsockname()[1]
+        
+        results = [
+            await post(port, "post", {"author": "Someone"}),
+            await post(port, "post", {"content": "Hi", "parent": "unknown"}),
+            await post(port, "../escape", {"content": "Hi"}),
+        ]
+        
+        listening.close()
+        await listening.wait_closed()
+        
+        return results
+    
+    assert [status for status, _ in asyncio.run(scenario())] == [400, 400, 404]
+    
+def test_bad_content_length(tmp_path):
+    """
+    A non-numeric or negative Content-Length gets a 400 response.
+    """
+    async def request(port, length):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"POST /post HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode("latin-1"))
+        response = await reader.read()
+        writer.close()
+        return response
+    
+    async def scenario():
+        intake = server.Intake(str(tmp_path), delay=0)
+        listening = await intake.serve(port=0)
+        port = listening.sockets[0].getsockname()[1]
+        
+        responses = [await request(port, "abc"), await request(port, "-5")]
+        
+        listening.close()
+        await listening.wait_closed()
+        
+        return responses
+    
+    for response in asyncio.run(scenario()):
+        assert response.startswith(b"HTTP/1.1 400 Bad Request\r\n")
+        assert b"Connection: close" in response
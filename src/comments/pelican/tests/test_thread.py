@@ -2,6 +2,8 @@
 Unit tests for various methods of the Thread class.
 """
 
+import shutil
+import datetime
 import pytest
 from comments.pelican.data import DummyComment, Comment, Thread
 from pprint import pprint
@@ -62,4 +64,104 @@ def test_replace_dummy(fake_comments, fixed_seed):
     assert thread.comments == [
         comment1, comment2, comment10, comment4, comment5, comment6, comment3
     ]
-    
\ No newline at end of file
+        
+def test_reindex_on_load(fake_comments):
+    """
+    Loading a thread computes positions, descendant counts and subtree spans.
+    """
+    thread = Thread("article-1", COMMENTS_PATH=fake_comments)
+    thread.load()
+    
+    assert [(x.uid, x.position, x.descendants) for x in thread] == [
+        ("jgpskmuex", 0, 1),
+        ("jdycemcr", 1, 0),
+        ("ejzizpcog", 2, 0)
+    ]
+    
+    top = thread.comments[0]
+    assert thread.comments[top.span.start:top.span.stop] == [top, thread.comments[1]]
+    
+def test_index_added(fake_comments, fixed_seed):
+    """
+    Adding to an indexed thread updates the subtree metadata incrementally,
+    with the same result as a full reindex.
+    """
+    thread = Thread("test-99", COMMENTS_PATH=fake_comments)
+    
+    top = thread.add(uid="top", order=0)
+    reply = thread.add(uid="reply", order=1, parent="top", level=1)
+    nested = thread.add(uid="nested", order=2, parent="reply", level=2)
+    other = thread.add(uid="other", order=3)
+    
+    incremental = [(x.uid, x.position, x.descendants) for x in thread]
+    
+    thread.reindex()
+    
+    assert incremental == [(x.uid, x.position, x.descendants) for x in thread]
+    assert top.descendants == 2
+    assert reply.descendants == 1
+    assert list(top.span) == [top.position, reply.position, nested.position]
+    
+def test_last_activity(fake_comments):
+    """
+    The latest date in each subtree.
+    """
+    thread = Thread("article-1", COMMENTS_PATH=fake_comments)
+    thread.load()
+    
+    assert [x.last_activity.isoformat() for x in thread] == [
+        "2016-02-11T23:40:22+00:00",
+        "2016-02-11T23:40:22+00:00",
+        "2016-02-11T23:40:20+00:00"
+    ]
+    
+def test_add_after_failed_load(fake_comments, fixed_seed):
+    """
+    A thread whose .thread file doesn't exist (yet) still indexes comments
+    added to it, the way the intake server uses new threads.
+    """
+    thread = Thread("test-99", COMMENTS_PATH=fake_comments)
+    
+    with pytest.raises(FileNotFoundError):
+        thread.load()
+        
+    top = thread.add(uid="top", order=0)
+    reply = thread.add(uid="reply", order=1, parent="top", level=1)
+    
+    assert [(x.uid, x.position, x.descendants) for x in thread] == [
+        ("top", 0, 1),
+        ("reply", 1, 0)
+    ]
+    assert list(top.span) == [0, 1]
+    
+def test_last_activity_added(fake_comments, tmp_path):
+    """
+    Adding (and saving) a comment updates the latest dates of its ancestors,
+    without another pass over the thread.
+    """
+    shutil.copytree(fake_comments, tmp_path, dirs_exist_ok=True)
+    
+    thread = Thread("article-1", COMMENTS_PATH=str(tmp_path))
+    thread.load()
+    
+    top, reply, other = thread.comments
+    assert top.last_activity.isoformat() == "2016-02-11T23:40:22+00:00"
+    
+    nested = thread.add(parent=reply.uid, level=2)
+    nested.metadata['date'] = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    nested.save("Later")
+    
+    assert thread._activity
+    
+    incremental = [x.last_activity for x in thread]
+    
+    thread._activity = False
+    thread.update_activity()
+    
+    assert incremental == [x.last_activity for x in thread]
+    assert [x.isoformat() for x in incremental] == [
+        "2020-01-01T00:00:00+00:00",
+        "2020-01-01T00:00:00+00:00",
+        "2020-01-01T00:00:00+00:00",
+        "2016-02-11T23:40:20+00:00"
+    ]
@@ -0,0 +1,42 @@
+"""
+Testing comments.pelican.util
+"""
+
+import os
+import filecmp
+from comments.pelican import util, check, data
+
+def test_generate_corpus(tmp_path):
+    """
+    Generated threads are consistent, and can be loaded.
+    """
+    path = str(tmp_path)
+    
+    counts = dict(util.generate_corpus(path, slugs=3, jobs=2, seed=1, top=5))
+    
+    assert sorted(counts) == ["article-0000", "article-0001", "article-0002"]
+    assert list(check.check(path, jobs=1)) == []
+    
+    thread = data.Thread("article-0001", COMMENTS_PATH=path)
+    thread.load()
+    
+    assert len(thread.comments) == counts["article-0001"]
+    assert thread.comments[0].level == 0
+    
+    thread.comments[-1].load()
+    assert "author" in thread.comments[-1].metadata
+    
+def test_generate_deterministic(tmp_path):
+    """
+    The same seed generates the same corpus, sharded or not.
+    """
+    first, second = os.path.join(tmp_path, "first"), os.path.join(tmp_path, "second")
+    
+    util.SlugGenerator("article", seed=7, COMMENTS_PATH=first).generate()
+    util.SlugGenerator("article", seed=7, COMMENTS_PATH=second, COMMENTS_SHARD_DEPTH=1).generate()
+    
+    assert filecmp.cmp(os.path.join(first, "article.thread"), os.path.join(second, "article.thread"), shallow=False)
+    
+    sharded = data.Thread("article", COMMENTS_PATH=second, COMMENTS_SHARD_DEPTH=1)
+    for uid, path in sharded.comment_files():
+        assert filecmp.cmp(path, os.path.join(first, "article", f"{uid}.md"), shallow=False)
@@ -1,9 +1,18 @@
 """
 Utilities.
+
+Generate a synthetic comments directory (see generate_corpus()):
+    python -m comments.pelican.util /path/to/comments --slugs 100 --seed 1
 """
 
 from . import data
+from .data import SlugMixin, bounded_map
+import os
+import sys
 import random
+import argparse
+import datetime
+from functools import partial
 
 
 class ThreadGenerator:
@@ -39,4 +48,179 @@ class ThreadGenerator:
             order = self.counter
             uid = f"parent-0-{order}"
             parent = self.thread.add(level=0, order=order, uid=uid, parent=None)
-            self.generate_children(parent, depth, child_count)
\ No newline at end of file
+            self.generate_children(parent, depth, child_count)
+
+# words for synthetic comments
+WORDS = """
+lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor
+incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud
+exercitation ullamco laboris nisi aliquip ex ea commodo consequat duis aute
+irure in reprehenderit voluptate velit esse cillum fugiat nulla pariatur
+excepteur sint occaecat cupidatat non proident sunt culpa qui officia deserunt
+mollit anim id est laborum python markdown pelican comment thread reply agree
+disagree thanks great post article example error traceback version install
+""".split()
+
+FIRST = "Archie Jenifer Sam Alex Robin Kim Lee Morgan Taylor Jordan Casey Riley Avery Quinn Jamie Drew".split()
+LAST = "Nguen Forcythe Johnson Smith Garcia Miller Davis Lopez Wilson Moore Clark Lewis Walker Young Hall".split()
+
+class SlugGenerator(SlugMixin):
+    """
+    Writes one synthetic thread, and its comments, straight to disk.
+    
+    Comments are generated depth-first and written as they are made, so
+    memory use depends on the depth of the thread, not its size.
+    
+    Number of top-level comments, and of replies at each level, are drawn from
+    exponential distributions (most comments get no replies, a few get a lot),
+    the mean number of replies shrinking by decay at each level.
+    """
+    def __init__(self, slug, seed=0, top=20, replies=1.5, decay=0.6, depth=6, **config):
+        self.slug = slug
+        self.config = config
+        
+        self.random = random.Random(f"{seed}/{slug}")
+        self.top = top
+        self.replies = replies
+        self.decay = decay
+        self.depth = depth
+        
+        self.authors = [f"{x} {y}" for x in FIRST for y in LAST]
+        self.random.shuffle(self.authors)
+        
+        self.order = 0
+        
+    def count(self, mean):
+        if mean <= 0:
+            return 0
+        return int(self.random.expovariate(1/mean))
+        
+    def author(self):
+        # a few authors write most of the comments
+        return self.authors[int(self.random.paretovariate(1.2)) % len(self.authors)]
+        
+    def words(self, count):
+        return " ".join(self.random.choice(WORDS) for x in range(count))
+        
+    def sentence(self):
+        words = [self.random.choice(WORDS) for x in range(self.random.randint(4, 16))]
+        
+        if self.random.random() < 0.2:
+            index = self.random.randrange(1, len(words))
+            words[index] = f"*{words[index]}*"
+            
+        return " ".join(words).capitalize() + self.random.choice("..!?")
+        
+    def body(self):
+        """
+        Markdown source for a comment: mostly short paragraphs, sometimes
+        with headings, lists, quotes, links or code, and rarely very long.
+        """
+        blocks = []
+        
+        for x in range(max(1, int(self.random.lognormvariate(0.3, 0.9)))):
+            kind = self.random.random()
+            
+            if kind < 0.05:
+                blocks.append(f"## {self.words(3).title()}")
+            elif kind < 0.15:
+                blocks.append("\n".join(f"* {self.words(self.random.randint(2, 6))}" for x in range(self.random.randint(2, 5))))
+            elif kind < 0.2:
+                blocks.append(f"> {self.sentence()}")
+            elif kind < 0.25:
+                lines = [f"    {self.words(self.random.randint(1, 5)).replace(' ', '_')}()" for x in range(self.random.randint(1, 8))]
+                blocks.append("\n".join(lines))
+            elif kind < 0.3:
+                blocks.append(f"{self.sentence()} [{self.words(2)}](http://example.com/{self.words(1)})")
+            else:
+                blocks.append(" ".join(self.sentence() for x in range(self.random.randint(1, 5))))
+                
+        return "\n\n".join(blocks) + "\n"
+        
+    def write_comment(self, thread, uid, level, parent, date):
+        print(f"{level}\t{self.order}\t{uid}\t{parent}", file=thread)
+        self.order += 1
+        
+        path = self.uid_path(uid)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        
+        with open(path, "w", encoding="utf-8") as output:
+            output.write(f"author: {self.author()}\ndate: {date.isoformat()}\n\n{self.body()}")
+            
+    def generate(self, start=datetime.datetime(2016, 1, 1, tzinfo=datetime.timezone.utc)):
+        """
+        Write the thread and its comments, returns the number of comments.
+        """
+        from hashids import Hashids
+        hashids = Hashids(min_length=8, alphabet='abcdefghijklmnopqrstuvwxyz')
+        
+        os.makedirs(self.comment_path, exist_ok=True)
+        date = start + datetime.timedelta(days=self.random.uniform(0, 365))
+        
+        with open(self.thread_path, "w", encoding="utf-8") as thread:
+            # (uid, level, date, replies left to write), one per level being written
+            stack = []
+            
+            for x in range(max(1, self.count(self.top))):
+                date += datetime.timedelta(minutes=self.random.expovariate(1/120))
+                uid = hashids.encode(self.order)
+                self.write_comment(thread, uid, 0, "", date)
+                stack.append([uid, 0, date, self.count(self.replies)])
+                
+                while stack:
+                    parent, level, parent_date, left = stack[-1]
+                    
+                    if left == 0 or level+1 > self.depth:
+                        stack.pop()
+                        continue
+                        
+                    stack[-1][3] -= 1
+                    
+                    reply_date = parent_date + datetime.timedelta(minutes=self.random.expovariate(1/60))
+                    uid = hashids.encode(self.order)
+                    self.write_comment(thread, uid, level+1, parent, reply_date)
+                    stack.append([uid, level+1, reply_date, self.count(self.replies * self.decay**(level+1))])
+                    
+        return self.order
+
+def generate_slug(base_path, slug, **options):
+    return slug, SlugGenerator(slug, COMMENTS_PATH=base_path, **options).generate()
+
+def generate_corpus(base_path, slugs=10, jobs=None, **options):
+    """
+    Generate a synthetic site: slugs threads (article-0000, article-0001, ...),
+    in parallel. Yields (slug, number of comments) as threads are done.
+    
+    options are passed to SlugGenerator (seed, top, replies, decay, depth)
+    along with config (e.g. COMMENTS_SHARD_DEPTH). The same seed and options
+    always generate the same corpus.
+    """
+    names = (f"article-{x:04d}" for x in range(slugs))
+    
+    yield from bounded_map(partial(generate_slug, base_path, **options), names, jobs)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic comments directory.")
+    parser.add_argument("path", help="comments directory to write to (COMMENTS_PATH)")
+    parser.add_argument("--slugs", type=int, default=10, help="number of threads")
+    parser.add_argument("--top", type=float, default=20, help="mean number of top-level comments per thread")
+    parser.add_argument("--replies", type=float, default=1.5, help="mean number of replies to a top-level comment")
+    parser.add_argument("--decay", type=float, default=0.6, help="factor the mean number of replies shrinks by at each level")
+    parser.add_argument("--depth", type=int, default=6, help="deepest reply level")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shard-depth", type=int, default=0, help="COMMENTS_SHARD_DEPTH layout to write")
+    parser.add_argument("--jobs", type=int, default=None, help="number of worker processes (default: one per cpu)")
+    
+    args = parser.parse_args(argv)
+    
+    total = 0
+    
+    for slug, count in generate_corpus(os.path.abspath(args.path), args.slugs, args.jobs, seed=args.seed, top=args.top,
+                                       replies=args.replies, decay=args.decay, depth=args.depth,
+                                       COMMENTS_SHARD_DEPTH=args.shard_depth):
+        total += count
+        
+    print(f"Wrote {total} comments in {args.slugs} threads to {args.path}")
+
+if __name__ == "__main__":
+    sys.exit(main())